@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+
+"""Compares serial and thread-pool scans of per-process usage
+
+Usage:
+
+    bench_procscan.py [iterations] [processes] [workers ...]
+
+Synopsis:
+
+    Starts the given number of idle child processes so that /proc holds a
+    large process table, then times ProcessScanner.scan on the calling
+    thread and with each given number of worker threads and prints the mean
+    time per scan in milliseconds. Defaults to 20 iterations, 2000 processes
+    and 2, 4 and 8 workers.
+
+Copyright:
+
+    bench_procscan.py compare serial and parallel process scan performance
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import subprocess
+import sys
+import time
+import timeit
+
+from resource_alerter.procscan import ProcessScanner
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+
+def bench(workers, iterations):
+    """Mean time of one scan with the given number of workers
+
+    Args:
+        workers (int): Threads reading PID directories
+
+        iterations (int): Number of scans to time
+
+    Returns:
+        tuple: (mean time per scan in milliseconds, processes scanned)
+    """
+
+    scanner = ProcessScanner(workers=workers)
+    scanned = len(scanner.scan(time.monotonic()))  # Start pool, fill table
+    elapsed = timeit.timeit(lambda: scanner.scan(time.monotonic()),
+                            number=iterations)
+    scanner.close()
+    return elapsed / iterations * 1e3, scanned
+
+
+if __name__ == '__main__':
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    pool_sizes = [int(i) for i in sys.argv[3:]] or [2, 4, 8]
+    children = [subprocess.Popen(['sleep', '3600']) for _ in
+                range(processes)]
+    try:
+        serial, scanned = bench(1, iterations)
+        print('{0} processes'.format(str(scanned)))
+        print('serial: {0:.2f} ms per scan'.format(serial))
+        for workers in pool_sizes:
+            parallel = bench(workers, iterations)[0]
+            print('{0} workers: {1:.2f} ms per scan, speedup {2:.1f}x'
+                  .format(str(workers), parallel, serial / parallel))
+    finally:
+        for child in children:
+            child.kill()
+        for child in children:
+            child.wait()
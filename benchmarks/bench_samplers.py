@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+
+"""Compares the per-check cost of the psutil and native samplers
+
+Usage:
+
+    bench_samplers.py [iterations]
+
+Synopsis:
+
+    Times one resource check's worth of sampling, i.e. one CPU usage and one
+    RAM usage reading, through each backend in resource_alerter.samplers and
+    prints the mean time per check in microseconds.
+
+Copyright:
+
+    bench_samplers.py compare psutil and native sampler performance
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+import timeit
+
+from resource_alerter.samplers import make_sampler
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+
+def check(sampler):
+    """Sample CPU and RAM usage once, as a single resource check would"""
+
+    sampler.sample()
+    sampler.cpu_percent()
+    sampler.ram_percent()
+
+
+def bench(backend, iterations):
+    """Mean time of one check with the given backend
+
+    Args:
+        backend (str): Sampler name accepted by make_sampler
+
+        iterations (int): Number of checks to time
+
+    Returns:
+        float: Mean time per check in microseconds
+    """
+
+    sampler = make_sampler(backend)
+    check(sampler)  # Open files and prime CPU baseline
+    elapsed = timeit.timeit(lambda: check(sampler), number=iterations)
+    return elapsed / iterations * 1e6
+
+
+if __name__ == '__main__':
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    results = {}
+    for backend in ('psutil', 'native'):
+        results[backend] = bench(backend, iterations)
+        print('{0}: {1:.2f} us per check'.format(backend, results[backend]))
+    print('speedup: {0:.1f}x'.format(results['psutil'] / results['native']))
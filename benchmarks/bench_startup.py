@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+
+"""Times daemon start-up: module imports and configuration loading
+
+Usage:
+
+    bench_startup.py [runs] [max_ms]
+
+Synopsis:
+
+    Starts fresh interpreters that import resource_alerter.resource_alerterd
+    and load both configuration files, first parsing the YAML and then from
+    the cached snapshots, and prints the median wall time of each in
+    milliseconds along with the slowest imports. Exits non-zero if start-up
+    from the cache takes longer than max_ms, so the benchmark can guard
+    against regressions. Defaults to 10 runs and no limit.
+
+Copyright:
+
+    bench_startup.py time resource_alerterd start-up
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Run in a fresh interpreter: import the daemon and load its configuration
+STARTUP = '''
+import resource_alerter.resource_alerterd
+from resource_alerter import config
+config.load('resource_alerterd.conf', config.validate, {0!r})
+config.load('resource_alerterd.logging.conf', None, {0!r})
+'''
+
+
+def run(code, options=()):
+    """Wall time of running code in a fresh interpreter
+
+    Args:
+        code (str): Python source to run
+
+        options (tuple): Extra interpreter options
+
+    Returns:
+        tuple: (wall time in milliseconds, STDERR of the interpreter)
+    """
+
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable] + list(options) + ['-c', code],
+                             stderr=subprocess.PIPE, check=True,
+                             universal_newlines=True)
+    return (time.perf_counter() - start) * 1e3, process.stderr
+
+
+def slowest_imports(importtime, count=5):
+    """Top-level imports taking the longest, from -X importtime output
+
+    Args:
+        importtime (str): STDERR of an interpreter run with -X importtime
+
+        count (int): Number of imports to return
+
+    Returns:
+        list: (cumulative milliseconds, module) tuples, slowest first
+    """
+
+    imports = []
+    for line in importtime.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].startswith('   ') and \
+                not fields[2].startswith('    '):  # Direct imports only
+            imports.append((int(fields[1]) / 1e3, fields[2].strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+if __name__ == '__main__':
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    max_ms = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    cache_folder = tempfile.mkdtemp()
+    code = STARTUP.format(cache_folder)
+    try:
+        cold = []
+        warm = []
+        for _ in range(runs):
+            for name in os.listdir(cache_folder):
+                os.remove(os.path.join(cache_folder, name))
+            cold.append(run(code)[0])
+            warm.append(run(code)[0])
+        baseline = statistics.median(run('pass')[0] for _ in range(runs))
+        print('interpreter alone: {0:.1f} ms'.format(baseline))
+        print('start-up parsing YAML: {0:.1f} ms'.format(
+                statistics.median(cold)))
+        print('start-up from cached config: {0:.1f} ms'.format(
+                statistics.median(warm)))
+        print('slowest imports:')
+        for milliseconds, module in slowest_imports(
+                run(code, ('-X', 'importtime'))[1]):
+            print('    {0}: {1:.1f} ms'.format(module, milliseconds))
+    finally:
+        shutil.rmtree(cache_folder)
+    if max_ms is not None and statistics.median(warm) > max_ms:
+        sys.exit('start-up from cached config exceeds {0} ms'.format(
+                str(max_ms)))
@@ -0,0 +1,277 @@
+#! /usr/bin/env python
+
+"""Times each phase of a resource check against synthetic process tables
+
+Usage:
+
+    bench_tick.py [-h] [--processes N [N ...]] [--churn RATE]
+                  [--kernel-ratio RATIO] [--ticks N] [--root DIR]
+                  [--output FILE]
+
+Synopsis:
+
+    For every process count, generates a fake procfs root (see
+    fakeprocfs.py), points a ResourceAlerter configured from the packaged
+    resource_alerterd.conf at it and runs resource checks, replacing a
+    fraction of processes between checks. Reports the time of
+    pids_same_test, non_kernel_pids, scan_processes, cpu_check, ram_check
+    and the whole tick, and the peak memory each allocates, as JSON so
+    runs can be compared to catch regressions.
+
+Copyright:
+
+    bench_tick.py benchmark resource checks on synthetic process tables
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fakeprocfs import FakeProcfs
+from resource_alerter import config as config_loader
+from resource_alerter.resource_alerterd import ResourceAlerter
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# ResourceAlerter methods timed individually; tick covers all of them
+PHASES = ('pids_same_test', 'non_kernel_pids', 'scan_processes',
+          'cpu_check', 'ram_check', 'tick')
+
+LOGGERS = ('debug_logger', 'info_logger', 'warning_logger', 'error_logger',
+           'critical_logger')
+
+
+class PhaseTimer:
+    """Wraps methods of an object to record their time and peak memory
+
+    While tracemalloc is tracing, the peak memory allocated by each call is
+    recorded too, nested calls included in their caller's peak.
+
+    Attributes:
+        peaks (dict): Maps phase to peak bytes allocated by its last traced
+            call
+
+        times (dict): Maps phase to a list of call durations in nanoseconds
+
+        timing (bool): False to not record durations, e.g. of calls slowed
+            down by tracemalloc
+    """
+
+    def __init__(self, target, phases):
+        """Replace each phase method of target with a timing wrapper
+
+        Args:
+            target (object): Object whose methods are timed
+
+            phases (tuple): Method names
+        """
+
+        self.peaks = {}
+        self.stack = []  # [current memory at entry, peak of nested calls]
+        self.times = dict((phase, []) for phase in phases)
+        self.timing = True
+        for phase in phases:
+            setattr(target, phase, self.wrap(phase, getattr(target, phase)))
+
+    def wrap(self, phase, method):
+        """Timing wrapper of one method"""
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                self.stack.append([tracemalloc.get_traced_memory()[0], 0])
+                tracemalloc.reset_peak()
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                if self.timing:
+                    self.times[phase].append(time.perf_counter_ns() - start)
+                if tracing:
+                    entry, nested = self.stack.pop()
+                    peak = max(tracemalloc.get_traced_memory()[1], nested)
+                    self.peaks[phase] = peak - entry
+                    if self.stack:  # Fold into the caller's peak
+                        self.stack[-1][1] = max(self.stack[-1][1], peak)
+        return timed
+
+    def clear(self):
+        """Forget recorded times"""
+
+        for times in self.times.values():
+            del times[:]
+
+
+def make_alerter(proc_root, history_file):
+    """ResourceAlerter using the packaged config, pointed at a fake procfs
+
+    Every registered check runs on every tick and never skips for similar
+    PIDs, so each tick exercises the full path.
+
+    Args:
+        proc_root (str): Fake procfs root
+
+        history_file (str): Path of the sample history file
+
+    Returns:
+        tuple: (ResourceAlerter, PhaseTimer wrapping its phases)
+    """
+
+    config = config_loader.load('resource_alerterd.conf', cache_folder=None)
+    config.update({'cgroup_check': False, 'core_check': False,
+                   'cpu_override_delay': 0.0, 'fleet_aggregator': None,
+                   'history_file': history_file, 'live_stats_file': None,
+                   'metrics_listen': None, 'proc_root': proc_root,
+                   'psi_wakeups': False, 'query_socket': None,
+                   'ram_override_delay': 0.0, 'sampler': 'native',
+                   'user_check': False})
+    alerter = ResourceAlerter(config)
+    timer = PhaseTimer(alerter, PHASES)
+    alerter.history.open()
+    alerter.register_check('cpu', alerter.cpu_check, 0.0)
+    alerter.register_check('ram', alerter.ram_check, 0.0)
+    return alerter, timer
+
+
+def summarize(times, peak):
+    """Statistics of one phase
+
+    Args:
+        times (list): Call durations in nanoseconds
+
+        peak (int): Peak bytes allocated by a traced call, None if unknown
+
+    Returns:
+        dict: Call count, mean, median and maximum in microseconds and peak
+            memory in KiB
+    """
+
+    if not times:
+        return {'calls': 0}
+    return {'calls': len(times),
+            'mean_us': round(statistics.mean(times) / 1e3, 1),
+            'median_us': round(statistics.median(times) / 1e3, 1),
+            'max_us': round(max(times) / 1e3, 1),
+            'peak_kib': None if peak is None else round(peak / 1024.0, 1)}
+
+
+def bench(root, processes, churn, kernel_ratio, ticks):
+    """Benchmark resource checks on one synthetic process table
+
+    Args:
+        root (str): Directory for the fake procfs root and history
+
+        processes (int): Number of processes
+
+        churn (float): Fraction of processes replaced between ticks
+
+        kernel_ratio (float): Fraction of processes that are kernel threads
+
+        ticks (int): Number of timed ticks
+
+    Returns:
+        dict: Scenario parameters, setup time and per-phase statistics
+    """
+
+    start = time.perf_counter()
+    procfs = FakeProcfs(os.path.join(root, 'proc'), processes, kernel_ratio)
+    setup = time.perf_counter() - start
+    alerter, timer = make_alerter(procfs.root,
+                                  os.path.join(root, 'history.dat'))
+    alerter.tick()  # Baseline: caches filled, first CPU reading
+    procfs.churn(churn)
+    timer.clear()
+    for _ in range(ticks):
+        alerter.tick()
+        procfs.churn(churn)
+    timer.timing = False  # Tracing slows every allocation, only keep memory
+    tracemalloc.start()
+    alerter.tick()
+    tracemalloc.stop()
+    alerter.history.close()
+    if alerter.process_scanner is not None:
+        alerter.process_scanner.close()
+    alerter.sampler.close()
+    shutil.rmtree(procfs.root)
+    return {'processes': processes, 'churn': churn,
+            'kernel_ratio': kernel_ratio, 'ticks': ticks,
+            'setup_s': round(setup, 2),
+            'phases': dict((phase, summarize(timer.times[phase],
+                                             timer.peaks.get(phase)))
+                           for phase in PHASES)}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=[1000, 10000],
+                        help='process counts to benchmark, e.g. 1000 to '
+                             '1000000 [default: 1000 10000]')
+    parser.add_argument('--churn', type=float, default=0.01,
+                        help='fraction of processes replaced between '
+                             'ticks [default: 0.01]')
+    parser.add_argument('--kernel-ratio', type=float, default=0.1,
+                        help='fraction of processes that are kernel '
+                             'threads [default: 0.1]')
+    parser.add_argument('--ticks', type=int, default=10,
+                        help='timed ticks per process count [default: 10]')
+    parser.add_argument('--root', default=None,
+                        help='directory for fake procfs trees, tmpfs '
+                             'recommended [default: a temporary directory]')
+    parser.add_argument('--output', default=None,
+                        help='write JSON here [default: STDOUT]')
+    args = parser.parse_args()
+
+    for name in LOGGERS:  # Records are created but go nowhere
+        logger = logging.getLogger(name)
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+
+    work_folder = tempfile.mkdtemp(dir=args.root)
+    try:
+        results = [bench(work_folder, processes, args.churn,
+                         args.kernel_ratio, args.ticks)
+                   for processes in args.processes]
+    finally:
+        shutil.rmtree(work_folder)
+    report = {'python': sys.version.split()[0],
+              'maxrss_kib': resource.getrusage(resource.RUSAGE_SELF)
+              .ru_maxrss,
+              'results': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
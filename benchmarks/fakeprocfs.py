@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+
+"""Generates a fake procfs root holding a synthetic process table
+
+Copyright:
+
+    fakeprocfs.py generate synthetic procfs trees for benchmarks
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import random
+import shutil
+
+from resource_alerter import procfs
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# /proc/<pid>/stat formatted with PID, name, parent PID, flags, user and
+# system time, start time and RSS at the positions of procfs.STAT_*
+STAT = '{0} ({1}) S {2} 1 1 0 -1 {3} 0 0 0 0 {4} {5} 0 0 20 0 1 0 {6} ' \
+       '10000000 {7} 18446744073709551615 0 0 0 0 0 0 0 0 0 0 0 0 17 0 0 ' \
+       '0 0 0 0\n'
+
+MEMINFO = 'MemTotal:       {0} kB\nMemFree:        {1} kB\n' \
+          'MemAvailable:   {1} kB\nBuffers:        0 kB\nCached:         ' \
+          '0 kB\n'
+
+CORES = 8
+
+
+class FakeProcfs:
+    """A directory laid out like /proc with a synthetic process table
+
+    Processes are user-space processes or kernel threads (PF_KTHREAD set)
+    with a /proc/<pid>/stat and /proc/<pid>/cgroup each. The aggregate
+    /proc/stat and /proc/meminfo advance on every churn so CPU and RAM usage
+    change between checks.
+
+    Attributes:
+        kernel_ratio (float): Fraction of processes that are kernel threads
+
+        pids (dict): Maps PID to True for kernel threads, False otherwise
+
+        root (str): Directory standing in for /proc
+    """
+
+    def __init__(self, root, processes, kernel_ratio=0.1, seed=0):
+        """Create the process table
+
+        Args:
+            root (str): Directory to create, removed first if it exists
+
+            processes (int): Number of processes
+
+            kernel_ratio (float): Fraction of processes that are kernel
+                threads
+
+            seed (int): Seed of the random generator, for repeatable runs
+        """
+
+        self.kernel_ratio = kernel_ratio
+        self.next_pid = 1
+        self.pids = {}
+        self.random = random.Random(seed)
+        self.root = root
+        self.ticks = 0
+        if os.path.isdir(root):
+            shutil.rmtree(root)
+        os.makedirs(root)
+        for _ in range(processes):
+            self.spawn()
+        self.advance()
+
+    def spawn(self):
+        """Create one process with the next free PID"""
+
+        pid = self.next_pid
+        self.next_pid += 1
+        kernel = self.random.random() < self.kernel_ratio
+        self.pids[pid] = kernel
+        folder = os.path.join(self.root, str(pid))
+        os.mkdir(folder)
+        self.write_stat(pid, self.random.randrange(0, 1000))
+        with open(os.path.join(folder, 'cgroup'), 'w') as cgroup:
+            cgroup.write('0::/system.slice/fake{0}.service\n'.format(
+                    str(pid % 50)))
+
+    def write_stat(self, pid, utime):
+        """Write /proc/<pid>/stat of a process
+
+        Args:
+            pid (int): Process ID
+
+            utime (int): User CPU time in clock ticks
+        """
+
+        flags = procfs.PF_KTHREAD if self.pids[pid] else 0
+        with open(os.path.join(self.root, str(pid), 'stat'), 'w') as stat:
+            stat.write(STAT.format(pid, 'kworker' if self.pids[pid]
+                                   else 'proc', max(pid // 10, 1), flags,
+                                   utime, utime // 10, pid,
+                                   0 if self.pids[pid] else 1000))
+
+    def kill(self, pid):
+        """Remove one process
+
+        Args:
+            pid (int): Process ID
+        """
+
+        shutil.rmtree(os.path.join(self.root, str(pid)))
+        del self.pids[pid]
+
+    def advance(self):
+        """Advance /proc/stat and /proc/meminfo to new usage values"""
+
+        self.ticks += 100
+        busy = self.random.randrange(0, 100)
+        line = '{0} 0 {1} {2} 0 0 0 0 0 0\n'
+        cores = ''.join('cpu{0} '.format(str(core)) +
+                        line.format(str(self.ticks * busy // 100),
+                                    str(self.ticks // 10),
+                                    str(self.ticks * (100 - busy) // 100))
+                        for core in range(CORES))
+        with open(os.path.join(self.root, 'stat'), 'w') as stat:
+            stat.write('cpu  ' + line.format(
+                    str(self.ticks * busy * CORES // 100),
+                    str(self.ticks * CORES // 10),
+                    str(self.ticks * (100 - busy) * CORES // 100)))
+            stat.write(cores)
+            stat.write('intr 0\nctxt 0\n')
+        total = 16777216
+        with open(os.path.join(self.root, 'meminfo'), 'w') as meminfo:
+            meminfo.write(MEMINFO.format(str(total), str(
+                    self.random.randrange(total // 10, total))))
+
+    def churn(self, rate):
+        """Replace a fraction of processes and advance CPU times
+
+        Args:
+            rate (float): Fraction of processes that exit and are replaced
+                by new ones
+        """
+
+        count = int(len(self.pids) * rate)
+        for pid in self.random.sample(sorted(self.pids), count):
+            self.kill(pid)
+        for _ in range(count):
+            self.spawn()
+        for pid in self.random.sample(sorted(self.pids), count):
+            self.write_stat(pid, self.ticks + self.random.randrange(0, 100))
+        self.advance()
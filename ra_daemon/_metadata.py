@@ -19,7 +19,7 @@ import re
 import collections
 import datetime
 
-import pkg_resources
+from importlib import metadata
 
 
 distribution_name = "python-daemon"
@@ -43,13 +43,13 @@ def get_distribution_version_info(filename=version_info_filename):
             }
 
     try:
-        distribution = pkg_resources.get_distribution(distribution_name)
-    except pkg_resources.DistributionNotFound:
+        distribution = metadata.distribution(distribution_name)
+    except metadata.PackageNotFoundError:
         distribution = None
 
     if distribution is not None:
-        if distribution.has_metadata(version_info_filename):
-            content = distribution.get_metadata(version_info_filename)
+        content = distribution.read_text(version_info_filename)
+        if content is not None:
             version_info = json.loads(content)
 
     return version_info
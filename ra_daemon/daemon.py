@@ -22,6 +22,7 @@ from __future__ import (absolute_import, unicode_literals)
 
 import os
 import sys
+import ctypes
 import pwd
 import resource
 import errno
@@ -844,6 +845,51 @@ def get_maximum_file_descriptors():
     return result
 
 
+try:
+    _close_range = ctypes.CDLL(None, use_errno=True).close_range
+    _close_range.argtypes = [ctypes.c_uint, ctypes.c_uint, ctypes.c_int]
+except (AttributeError, OSError):
+    # C library predates the ``close_range`` wrapper (glibc 2.34).
+    _close_range = None
+
+
+def get_open_file_descriptors():
+    """ Get the file descriptors currently open in this process.
+
+        :return: A list of the open file descriptors, or ``None`` if
+            they cannot be enumerated.
+
+        The descriptors are enumerated from ``/proc/self/fd``. The
+        list may include the descriptor used to read that directory,
+        which is already closed when this function returns.
+
+        """
+    try:
+        names = os.listdir("/proc/self/fd")
+    except EnvironmentError:
+        return None
+    return [int(name) for name in names]
+
+
+def get_file_descriptor_ranges(maxfd, exclude=set()):
+    """ Get the ranges of file descriptors between those to exclude.
+
+        :param maxfd: The number of file descriptors to cover.
+        :param exclude: Collection of file descriptors to leave out.
+        :return: A list of (low, high) tuples, both ends inclusive,
+            which together cover every descriptor below `maxfd`
+            except those in `exclude`.
+
+        """
+    ranges = []
+    low = 0
+    for fd in sorted(set(fd for fd in exclude if 0 <= fd < maxfd)) + [maxfd]:
+        if fd > low:
+            ranges.append((low, fd - 1))
+        low = fd + 1
+    return ranges
+
+
 def close_all_open_files(exclude=set()):
     """ Close all open file descriptors.
 
@@ -855,11 +901,35 @@ def close_all_open_files(exclude=set()):
         specified, `exclude` is a set of file descriptors to *not*
         close.
 
+        Rather than calling close on every descriptor up to the limit,
+        which takes a million system calls under a high
+        ``RLIMIT_NOFILE``, the fastest available method is used:
+
+        * The ``close_range`` system call (Linux 5.9), once per range
+          of descriptors between those in `exclude`.
+
+        * Otherwise, close each descriptor listed in
+          ``/proc/self/fd``.
+
+        * Otherwise, ``os.closerange`` once per range.
+
         """
     maxfd = get_maximum_file_descriptors()
-    for fd in reversed(range(maxfd)):
-        if fd not in exclude:
-            close_file_descriptor_if_open(fd)
+    ranges = get_file_descriptor_ranges(maxfd, exclude)
+    if _close_range is not None:
+        if all(_close_range(low, high, 0) == 0 for (low, high) in ranges):
+            return
+        # Kernel predates ``close_range``; fall back.
+
+    open_fds = get_open_file_descriptors()
+    if open_fds is not None:
+        for fd in sorted(open_fds, reverse=True):
+            if fd < maxfd and fd not in exclude:
+                close_file_descriptor_if_open(fd)
+        return
+
+    for (low, high) in ranges:
+        os.closerange(low, high + 1)
 
 
 def redirect_stream(system_stream, target_stream):
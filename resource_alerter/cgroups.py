@@ -0,0 +1,393 @@
+#! /usr/bin/env python
+
+"""cgroup v2 usage relative to each cgroup's limits
+
+Copyright:
+
+    cgroups.py monitor cgroup v2 resource usage
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import namedtuple
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import resource
+import struct
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# Interface files kept open for every cgroup, missing files are skipped
+FILES = ('cpu.max', 'cpu.pressure', 'cpu.stat', 'memory.current',
+         'memory.max', 'memory.pressure')
+
+# Share of the soft RLIMIT_NOFILE that open cgroups may use, the rest is
+# left for logs, /proc reads and sockets
+FD_SHARE = 0.5
+
+# inotify constants, see linux/inotify.h
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+CgroupUsage = namedtuple('CgroupUsage', ['path', 'memory_percent',
+                                         'cpu_percent', 'memory_pressure',
+                                         'cpu_pressure'])
+
+
+def parse_pressure(data):
+    """Ten second average of the 'some' line of a *.pressure file
+
+    Args:
+        data (bytes): Contents of cpu.pressure or memory.pressure
+
+    Returns:
+        float: Percent of time some tasks stalled, None if absent
+    """
+
+    start = data.find(b'some avg10=')
+    if start < 0:
+        return None
+    start += len(b'some avg10=')
+    return float(data[start:data.find(b' ', start)])
+
+
+def parse_stat(data, field):
+    """Value of a field of a flat-keyed file such as cpu.stat
+
+    Args:
+        data (bytes): File contents
+
+        field (bytes): Field name
+
+    Returns:
+        int: Field value, None if absent
+    """
+
+    for line in data.splitlines():
+        key, _, value = line.partition(b' ')
+        if key == field:
+            return int(value)
+    return None
+
+
+class Cgroup:
+    """Permanently open interface files of one cgroup
+
+    Attributes:
+        fds (dict): Maps interface file name to open file descriptor
+
+        path (str): Path of the cgroup directory
+    """
+
+    def __init__(self, path):
+        """Open the interface files of a cgroup
+
+        Args:
+            path (str): Path of the cgroup directory
+        """
+
+        self.fds = {}
+        self.last_time = None
+        self.last_usage = None
+        self.path = path
+        for name in FILES:
+            try:
+                self.fds[name] = os.open(os.path.join(path, name),
+                                         os.O_RDONLY | os.O_CLOEXEC)
+            except (IOError, OSError) as error:
+                if error.errno != errno.ENOENT:  # Else controller disabled
+                    logging.getLogger('error_logger').error(
+                            '{0}: Cannot open {1}'.format(
+                                    str(error), os.path.join(path, name)))
+
+    def close(self):
+        """Close every interface file"""
+
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+    def read(self, name):
+        """Re-read an interface file from its open file descriptor
+
+        Args:
+            name (str): One of FILES
+
+        Returns:
+            bytes: File contents, None if the file is not open or the
+                cgroup was removed
+        """
+
+        fd = self.fds.get(name)
+        if fd is None:
+            return None
+        try:
+            return os.pread(fd, 4096, 0)
+        except (IOError, OSError):  # Removed since last refresh
+            return None
+
+    def sample(self, now):
+        """Usage of the cgroup relative to its limits
+
+        Args:
+            now (float): Current monotonic time in seconds
+
+        Returns:
+            CgroupUsage: Memory and CPU usage in percent of memory.max and
+                cpu.max and pressure averages, each None if the limit or
+                file is absent; CPU usage is None on the first sample
+        """
+
+        memory_percent = None
+        limit = self.read('memory.max')
+        current = self.read('memory.current')
+        if limit and current and limit.strip() != b'max':
+            memory_percent = int(current) * 100.0 / int(limit)
+
+        cpu_percent = None
+        usage = None
+        stat = self.read('cpu.stat')
+        if stat:
+            usage = parse_stat(stat, b'usage_usec')
+        quota = self.read('cpu.max')
+        if quota and usage is not None and self.last_usage is not None:
+            quota, period = quota.split()
+            elapsed = now - self.last_time
+            if quota != b'max' and elapsed > 0:
+                allowed = elapsed * 1000000.0 * int(quota) / int(period)
+                cpu_percent = (usage - self.last_usage) * 100.0 / allowed
+        self.last_time = now
+        self.last_usage = usage
+
+        memory_pressure = self.read('memory.pressure')
+        cpu_pressure = self.read('cpu.pressure')
+        return CgroupUsage(
+                self.path, memory_percent, cpu_percent,
+                parse_pressure(memory_pressure) if memory_pressure else None,
+                parse_pressure(cpu_pressure) if cpu_pressure else None)
+
+
+class CgroupMonitor:
+    """Discovers cgroups through inotify and samples them every check
+
+    The hierarchy is walked once when opened. Afterwards an inotify watch on
+    every cgroup directory reports cgroups being created and removed, so a
+    refresh reads pending events instead of walking the tree. If inotify is
+    unavailable or its queue overflows the tree is walked again.
+
+    Every cgroup holds up to len(FILES) open files, so at most max_cgroups
+    are monitored at once; further cgroups are skipped with a warning
+    rather than running the daemon out of file descriptors.
+
+    Attributes:
+        cgroups (dict): Maps cgroup path to Cgroup
+
+        inotify_fd (int): inotify instance, None if walking the tree on
+            every refresh
+
+        max_cgroups (int): Most cgroups monitored at once
+
+        root (str): Mount point of the cgroup v2 hierarchy
+
+        watches (dict): Maps inotify watch descriptor to cgroup path
+    """
+
+    def __init__(self, root=None, max_cgroups=None):
+        """Describe the hierarchy, open must be called before use
+
+        Args:
+            root (str): Mount point of the cgroup v2 hierarchy, defaults to
+                CGROUP_ROOT
+
+            max_cgroups (int): Most cgroups monitored at once, defaults to
+                as many as fit in FD_SHARE of the soft RLIMIT_NOFILE
+        """
+
+        if max_cgroups is None:
+            soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+            if soft_limit == resource.RLIM_INFINITY:
+                soft_limit = 1048576
+            max_cgroups = int(soft_limit * FD_SHARE) // len(FILES)
+        self.cgroups = {}
+        self.full = False  # True once a cgroup was skipped for max_cgroups
+        self.inotify_fd = None
+        self.libc = None
+        self.max_cgroups = max_cgroups
+        self.root = CGROUP_ROOT if root is None else root
+        self.watches = {}
+        self._paths = {}  # Inverse of watches
+
+    def open(self):
+        """Start watching the hierarchy and open every cgroup
+
+        Returns:
+            bool: True if cgroups are discovered through inotify, False if
+                the tree is walked on every refresh
+        """
+
+        error_logger = logging.getLogger('error_logger')
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                    use_errno=True)
+            fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(
+                        ctypes.get_errno()))
+            self.inotify_fd = fd
+        except (AttributeError, OSError) as error:
+            error_logger.error('{0}: Cannot watch cgroups with '
+                               'inotify'.format(str(error)))
+            self.inotify_fd = None
+        self.walk()
+        return self.inotify_fd is not None
+
+    def close(self):
+        """Close every cgroup and the inotify instance"""
+
+        for cgroup in self.cgroups.values():
+            cgroup.close()
+        self.cgroups = {}
+        self.watches = {}
+        self._paths = {}
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def _add(self, path):
+        """Watch and open one cgroup unless already known"""
+
+        if path in self.cgroups:
+            return
+        if len(self.cgroups) >= self.max_cgroups:
+            if not self.full:
+                logging.getLogger('warning_logger').warning(
+                        'Monitoring at most {0} cgroups to stay within '
+                        'RLIMIT_NOFILE: skipping {1} and further '
+                        'cgroups'.format(str(self.max_cgroups), path))
+                self.full = True
+            return
+        if self.inotify_fd is not None:
+            wd = self.libc.inotify_add_watch(
+                    self.inotify_fd, os.fsencode(path),
+                    IN_CREATE | IN_DELETE | IN_ONLYDIR)
+            if wd < 0:  # Removed already, or out of watches
+                if ctypes.get_errno() != 2:  # ENOENT
+                    logging.getLogger('error_logger').error(
+                            '{0}: Cannot watch {1}, walking cgroups on '
+                            'every check'.format(
+                                    os.strerror(ctypes.get_errno()), path))
+                    os.close(self.inotify_fd)
+                    self.inotify_fd = None
+                    self.watches = {}
+                    self._paths = {}
+                else:
+                    return
+            else:
+                self.watches[wd] = path
+                self._paths[path] = wd
+        self.cgroups[path] = Cgroup(path)
+
+    def _remove(self, path):
+        """Close a cgroup and every cgroup below it"""
+
+        prefix = path + os.sep
+        for known in [known for known in self.cgroups
+                      if known == path or known.startswith(prefix)]:
+            self.cgroups.pop(known).close()
+            self.full = False
+            wd = self._paths.pop(known, None)
+            if wd is not None:
+                self.watches.pop(wd, None)
+
+    def walk(self, top=None):
+        """Add every cgroup below top and forget removed ones
+
+        Args:
+            top (str): Directory to walk, defaults to root
+        """
+
+        top = self.root if top is None else top
+        found = set()
+        for directory, _, _ in os.walk(top):
+            found.add(directory)
+            self._add(directory)
+        prefix = top + os.sep
+        for path in [path for path in self.cgroups if path not in found and
+                     (path == top or path.startswith(prefix))]:
+            self._remove(path)
+
+    def refresh(self):
+        """Apply cgroups created or removed since the last refresh"""
+
+        if self.inotify_fd is None:
+            self.walk()
+            return
+        while True:
+            try:
+                data = os.read(self.inotify_fd, 65536)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:
+                            offset + INOTIFY_EVENT.size + length]
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self.walk()
+                    continue
+                parent = self.watches.get(wd)
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    if parent is not None:
+                        self._paths.pop(parent, None)
+                    continue
+                if parent is None or not mask & IN_ISDIR:
+                    continue
+                path = os.path.join(parent, os.fsdecode(name.rstrip(b'\0')))
+                if mask & IN_CREATE:
+                    self.walk(path)  # Children may predate the watch
+                elif mask & IN_DELETE:
+                    self._remove(path)
+
+    def sample(self, now):
+        """Usage of every cgroup
+
+        Args:
+            now (float): Current monotonic time in seconds
+
+        Returns:
+            list: CgroupUsage of every cgroup
+        """
+
+        self.refresh()
+        return [cgroup.sample(now) for cgroup in self.cgroups.values()]
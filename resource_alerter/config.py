@@ -0,0 +1,157 @@
+#! /usr/bin/env python
+
+"""Load packaged configuration files, caching validated snapshots
+
+Copyright:
+
+    config.py load and cache resource_alerter configuration
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import contextlib
+import json
+import numbers
+import os
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Default directory of cached config snapshots
+CACHE_FOLDER = '/var/run/resource_alerterd'
+
+# Folder holding the package data of an installed, unzipped package
+PACKAGE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def package_file(name):
+    """Context manager yielding a filesystem path to package data
+
+    The package is installed unzipped, so the file is normally found next
+    to this module without importing importlib.resources, which alone costs
+    tens of milliseconds. Otherwise importlib.resources extracts it.
+
+    Args:
+        name (str): File name within the resource_alerter package
+
+    Returns:
+        contextmanager: Yields the path to the file
+    """
+
+    path = os.path.join(PACKAGE_FOLDER, name)
+    if os.path.isfile(path):
+        return contextlib.nullcontext(path)
+    from importlib import resources
+    return resources.as_file(resources.files('resource_alerter')
+                             .joinpath(name))
+
+
+def parse_yaml(stream):
+    """Parse YAML with the libyaml-based loader if PyYAML was built with it
+
+    PyYAML is only imported here, so starting from a cached snapshot never
+    imports it.
+
+    Args:
+        stream (file): Open YAML file
+
+    Returns:
+        object: Parsed document
+    """
+
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    return yaml.load(stream, Loader=loader)
+
+
+def validate(config):
+    """Check the value types and ranges of a resource_alerterd.conf
+
+    Args:
+        config (dict): Parsed resource_alerterd.conf
+
+    Raises:
+        ValueError: If a delay is not a positive number or a level is not a
+            percentage
+    """
+
+    if not isinstance(config, dict):
+        raise ValueError('Configuration must be a mapping of options')
+    for key, value in config.items():
+        if key.endswith('_delay') and (
+                not isinstance(value, numbers.Real) or value <= 0):
+            raise ValueError('{0} must be a positive number of seconds, not '
+                             '{1}'.format(key, repr(value)))
+        if key.endswith('_level') and (
+                not isinstance(value, numbers.Real) or
+                not 0.0 <= value <= 100.0):
+            raise ValueError('{0} must be a percentage, not {1}'.format(
+                    key, repr(value)))
+
+
+def load(name, validator=None, cache_folder=CACHE_FOLDER):
+    """Load a YAML file packaged with resource_alerter
+
+    The parsed and validated file is cached as JSON in cache_folder, keyed
+    by the path, modification time and size of the file, so restarts skip
+    YAML parsing until the file changes. A missing or unwritable cache is
+    not an error.
+
+    Args:
+        name (str): File name within the resource_alerter package
+
+        validator (function): Called with the parsed file before it is
+            cached, raises on invalid contents
+
+        cache_folder (str): Folder of cached snapshots, None disables
+            caching
+
+    Returns:
+        object: Parsed file
+    """
+
+    with package_file(name) as path:
+        stat = os.stat(path)
+        key = [str(path), stat.st_mtime_ns, stat.st_size]
+        cache_path = None
+        if cache_folder is not None:
+            cache_path = os.path.join(cache_folder, name + '.json')
+            try:
+                with open(cache_path) as cache_file:
+                    cache = json.load(cache_file)
+                if cache.get('key') == key:
+                    return cache['config']
+            except (IOError, OSError, ValueError):  # Missing or corrupt
+                pass
+        with open(path, 'rb') as config_file:
+            config = parse_yaml(config_file)
+    if validator is not None:
+        validator(config)
+    if cache_path is not None:
+        temporary_path = '{0}.{1}'.format(cache_path, str(os.getpid()))
+        try:
+            with open(temporary_path, 'w') as cache_file:
+                json.dump({'key': key, 'config': config}, cache_file)
+            os.replace(temporary_path, cache_path)  # Readers never see half
+        except (IOError, OSError, TypeError, ValueError):
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+    return config
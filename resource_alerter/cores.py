@@ -0,0 +1,228 @@
+#! /usr/bin/env python
+
+"""Per-core CPU usage and sustained hot-core detection
+
+Copyright:
+
+    cores.py monitor per-core CPU usage
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from collections import namedtuple
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+NAN = float('nan')
+
+# NumPy, imported by load_numpy on first use so that the daemon does not pay
+# for it at start-up unless core_check is enabled; None if not installed
+numpy = None
+_numpy_tried = False
+
+CoreSummary = namedtuple('CoreSummary', ['cores', 'hot', 'sustained', 'mean',
+                                         'maximum', 'imbalance'])
+
+
+def load_numpy():
+    """Import NumPy the first time it is needed
+
+    Returns:
+        bool: True if NumPy is installed, else the loops over cores are used
+    """
+
+    global numpy, _numpy_tried
+    if not _numpy_tried:
+        _numpy_tried = True
+        try:
+            import numpy
+        except ImportError:  # Falls back to a loop over cores
+            numpy = None
+    return numpy is not None
+
+
+def busy_total(rows):
+    """Busy and total CPU time of each core, computed as psutil does
+
+    Guest time is already included in user time and is not counted twice;
+    idle and I/O wait time are not busy.
+
+    Args:
+        rows (list): Per-core CPU times in /proc/stat column order (user,
+            nice, system, idle, iowait, ...), a 2-D NumPy array if NumPy is
+            installed
+
+    Returns:
+        tuple: (busy, total) with one entry per core, NumPy arrays if NumPy
+            is installed else arrays of floats
+    """
+
+    if load_numpy():
+        times = numpy.asarray(rows, dtype=numpy.float64)
+        total = times.sum(axis=1)
+        if times.shape[1] > 8:
+            total -= times[:, 8:10].sum(axis=1)
+        busy = total - times[:, 3:5].sum(axis=1)
+        return busy, total
+
+    busy = array('d')
+    total = array('d')
+    for row in rows:
+        core_total = float(sum(row)) - sum(row[8:10])
+        total.append(core_total)
+        busy.append(core_total - sum(row[3:5]))
+    return busy, total
+
+
+def parse_core_lines(block):
+    """Parse the cpuN lines of /proc/stat
+
+    Args:
+        block (bytes): Consecutive 'cpuN ...' lines of /proc/stat
+
+    Returns:
+        tuple: (busy, total) as returned by busy_total
+    """
+
+    if load_numpy():
+        first_end = block.find(b'\n')
+        columns = len(block[:first_end if first_end >= 0 else len(block)]
+                      .split())
+        fields = numpy.array(block.split())
+        rows = fields.reshape(-1, columns)[:, 1:].astype(numpy.float64)
+        return busy_total(rows)
+    return busy_total([[int(i) for i in line.split()[1:]]
+                       for line in block.splitlines() if line])
+
+
+class CoreMonitor:
+    """Tracks how long each core has been above a usage level
+
+    Per-core usage is computed from the CPU time consumed since the previous
+    update. With NumPy installed every update is a handful of array
+    operations over all cores at once, otherwise a single loop over arrays
+    of floats; no object is kept per core either way.
+
+    Attributes:
+        duration (float): Seconds a core must stay hot to count as
+            sustained
+
+        hot_since (array): Time each core became hot, NaN if not hot
+
+        level (float): Percent usage at or above which a core is hot
+    """
+
+    def __init__(self, level, duration):
+        """Initialize monitor, the first update only records a baseline
+
+        Args:
+            level (float): Percent usage at or above which a core is hot
+
+            duration (float): Seconds a core must stay hot to count as
+                sustained
+        """
+
+        load_numpy()
+        self.duration = duration
+        self.hot_since = None
+        self.last_busy = None
+        self.last_total = None
+        self.level = level
+
+    def update(self, now, busy, total):
+        """Compute per-core usage since the last update
+
+        Args:
+            now (float): Current time in seconds, monotonic
+
+            busy (array): Busy CPU time of each core
+
+            total (array): Total CPU time of each core
+
+        Returns:
+            CoreSummary: Number of cores, hot cores, cores hot for at least
+                duration, mean and maximum usage and imbalance (maximum
+                minus mean) in percent, None on the first update or after
+                the number of online cores changed
+        """
+
+        last_busy = self.last_busy
+        last_total = self.last_total
+        self.last_busy = busy
+        self.last_total = total
+        if last_total is None or len(last_total) != len(total):
+            self.hot_since = None
+            return None
+        if numpy is not None:
+            return self._update_numpy(now, busy, total, last_busy,
+                                      last_total)
+        return self._update_loop(now, busy, total, last_busy, last_total)
+
+    def _update_numpy(self, now, busy, total, last_busy, last_total):
+        """Vectorized update, see update"""
+
+        delta_total = total - last_total
+        delta_busy = numpy.clip(busy - last_busy, 0.0, None)
+        percents = numpy.divide(delta_busy * 100.0, delta_total,
+                                out=numpy.zeros_like(delta_total),
+                                where=delta_total > 0)
+        hot = percents >= self.level
+        if self.hot_since is None:
+            self.hot_since = numpy.full(len(total), NAN)
+        # fmin keeps the earliest time a core became hot, NaN means not hot
+        self.hot_since = numpy.where(hot, numpy.fmin(self.hot_since, now),
+                                     NAN)
+        with numpy.errstate(invalid='ignore'):
+            sustained = int(numpy.count_nonzero(
+                    now - self.hot_since >= self.duration))
+        mean = float(percents.mean())
+        maximum = float(percents.max())
+        return CoreSummary(len(total), int(numpy.count_nonzero(hot)),
+                           sustained, mean, maximum, maximum - mean)
+
+    def _update_loop(self, now, busy, total, last_busy, last_total):
+        """Update without NumPy, see update"""
+
+        if self.hot_since is None:
+            self.hot_since = array('d', [NAN]) * len(total)
+        hot_since = self.hot_since
+        hot = 0
+        sustained = 0
+        percent_sum = 0.0
+        maximum = 0.0
+        for core in range(len(total)):
+            delta_total = total[core] - last_total[core]
+            delta_busy = max(busy[core] - last_busy[core], 0.0)
+            percent = delta_busy * 100.0 / delta_total \
+                if delta_total > 0 else 0.0
+            percent_sum += percent
+            maximum = max(maximum, percent)
+            if percent >= self.level:
+                hot += 1
+                if hot_since[core] != hot_since[core]:  # NaN, newly hot
+                    hot_since[core] = now
+                if now - hot_since[core] >= self.duration:
+                    sustained += 1
+            else:
+                hot_since[core] = NAN
+        mean = percent_sum / len(total) if len(total) else 0.0
+        return CoreSummary(len(total), hot, sustained, mean, maximum,
+                           maximum - mean)
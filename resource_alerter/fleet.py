@@ -0,0 +1,541 @@
+#! /usr/bin/env python
+
+"""Push samples to a fleet aggregator over UDP and alert on the fleet
+
+Usage:
+
+    python -m resource_alerter.fleet aggregate [address]
+
+    python -m resource_alerter.fleet simulate <hosts> [address]
+
+Synopsis:
+
+    'aggregate' runs an aggregator in the foreground, printing host and
+    fleet alerts. 'simulate' starts one process per simulated host, each
+    pushing random CPU and RAM samples every second, so a fleet can be
+    tested on a single machine. address defaults to 127.0.0.1:9779.
+
+Copyright:
+
+    fleet.py aggregate resource usage of many hosts
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import namedtuple
+import logging
+import multiprocessing
+import random
+import select
+import socket
+import struct
+import sys
+import time
+from resource_alerter.stats import SampleRing
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Datagram: header followed by count records, sized to fit one Ethernet
+# frame so datagrams are never fragmented
+HEADER = struct.Struct('<4sBxH32s')  # Magic, version, count, host ID
+RECORD = struct.Struct('<dBBBxf')  # Time, kind, resource, level, value
+DEFAULT_ADDRESS = '127.0.0.1:9779'
+MAGIC = b'RAFL'
+VERSION = 1
+MAX_RECORDS = 80
+DATAGRAM_SIZE = HEADER.size + MAX_RECORDS * RECORD.size
+
+KIND_SAMPLE = 0
+KIND_ALERT = 1
+RESOURCES = ('CPU', 'RAM')
+LEVELS = (None, 'Warning', 'Critical')  # Index is the level on the wire
+
+# Seconds before retrying an aggregator that could not be resolved, doubled
+# after every failure up to RETRY_MAX
+RETRY_MIN = 5.0
+RETRY_MAX = 300.0
+
+FleetAlert = namedtuple('FleetAlert', ['resource', 'level', 'hosts',
+                                       'total'])
+
+
+def parse_address(address):
+    """Split a 'host:port' string
+
+    Args:
+        address (str): e.g. 'aggregator.example.org:9779'
+
+    Returns:
+        tuple: (host, port) as accepted by socket functions
+    """
+
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+
+class FleetSender:
+    """Batches samples and alerts into datagrams sent to an aggregator
+
+    Records are packed into a preallocated datagram as they are added and
+    the datagram is sent when full or flushed, normally once per resource
+    check. Sending never blocks; datagrams that cannot be sent are dropped.
+    The aggregator is resolved once, when the sender is created; if that
+    fails, records are dropped and resolving is retried with exponential
+    backoff.
+
+    Attributes:
+        address (tuple): (host, port) of the aggregator
+
+        backoff (float): Seconds to wait after the next failed resolution
+
+        count (int): Number of records in the pending datagram
+
+        host_id (bytes): Name of this host, at most 32 bytes
+
+        resolved (tuple): (family, type, protocol, address) of the
+            aggregator, None until resolved
+
+        retry_at (float): Monotonic time after which resolving is retried
+    """
+
+    def __init__(self, address, host_id=None):
+        """Describe the aggregator, the socket is opened by the first flush
+
+        Args:
+            address (str): 'host:port' of the aggregator
+
+            host_id (str): Name of this host, defaults to the hostname
+        """
+
+        self.address = parse_address(address)
+        self.backoff = RETRY_MIN
+        self.buffer = bytearray(DATAGRAM_SIZE)
+        self.count = 0
+        host_id = socket.gethostname() if host_id is None else host_id
+        self.host_id = host_id.encode('utf-8')[:32]
+        self.resolved = None
+        self.retry_at = 0.0
+        self.socket = None
+        self.resolve()
+
+    def resolve(self):
+        """Look up the aggregator's address
+
+        Returns:
+            bool: True if resolved, False if the lookup failed and was
+                scheduled for retry
+        """
+
+        try:
+            family, kind, protocol, _, address = socket.getaddrinfo(
+                    self.address[0], self.address[1], 0,
+                    socket.SOCK_DGRAM)[0]
+        except (IOError, OSError) as error:  # Includes socket.gaierror
+            logging.getLogger('error_logger').error(
+                    'Cannot resolve fleet aggregator {0}: {1}: retrying in '
+                    '{2} sec'.format(self.address[0], str(error),
+                                     str(self.backoff)))
+            self.retry_at = time.monotonic() + self.backoff
+            self.backoff = min(self.backoff * 2.0, RETRY_MAX)
+            return False
+        self.backoff = RETRY_MIN
+        self.resolved = (family, kind, protocol, address)
+        return True
+
+    def add(self, timestamp, kind, resource, level, value):
+        """Append a record to the pending datagram, sending it if full
+
+        Args:
+            timestamp (float): Seconds since Epoch
+
+            kind (int): KIND_SAMPLE or KIND_ALERT
+
+            resource (str): One of RESOURCES
+
+            level (str): One of LEVELS
+
+            value (float): Usage in percent
+        """
+
+        RECORD.pack_into(self.buffer, HEADER.size + self.count * RECORD.size,
+                         timestamp, kind, RESOURCES.index(resource),
+                         LEVELS.index(level), value)
+        self.count += 1
+        if self.count == MAX_RECORDS:
+            self.flush()
+
+    def sample(self, timestamp, resource, value, level=None):
+        """Append a usage sample, see add"""
+
+        self.add(timestamp, KIND_SAMPLE, resource, level, value)
+
+    def alert(self, timestamp, resource, level, value):
+        """Append an alert raised by this host, see add"""
+
+        self.add(timestamp, KIND_ALERT, resource, level, value)
+
+    def flush(self):
+        """Send the pending datagram if it holds any records"""
+
+        if not self.count:
+            return
+        if self.resolved is None and (time.monotonic() < self.retry_at or
+                                      not self.resolve()):
+            self.count = 0  # Aggregator unknown, drop the records
+            return
+        HEADER.pack_into(self.buffer, 0, MAGIC, VERSION, self.count,
+                         self.host_id)
+        try:
+            if self.socket is None:  # Opened here to survive daemonization
+                self.socket = socket.socket(*self.resolved[:3])
+                self.socket.setblocking(False)
+            self.socket.sendto(memoryview(self.buffer)[
+                    :HEADER.size + self.count * RECORD.size],
+                    self.resolved[3])
+        except (IOError, OSError) as error:
+            logging.getLogger('error_logger').error(
+                    '{0}: Dropped {1} records for fleet aggregator'.format(
+                            str(error), str(self.count)))
+        self.count = 0
+
+    def close(self):
+        """Send pending records and close the socket"""
+
+        self.flush()
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+class HostState:
+    """Recent samples and alert levels of one host
+
+    Attributes:
+        last_seen (float): Monotonic time of the last datagram
+
+        levels (dict): Maps resource to the level of its latest sample
+
+        samples (dict): Maps resource to a SampleRing of its samples
+    """
+
+    def __init__(self, capacity):
+        """Preallocate sample rings
+
+        Args:
+            capacity (int): Samples kept per resource
+        """
+
+        self.last_seen = None
+        self.levels = dict.fromkeys(RESOURCES, 0)
+        self.samples = dict((resource, SampleRing(capacity))
+                            for resource in RESOURCES)
+
+
+class FleetAggregator:
+    """Receives datagrams from many hosts and alerts on the whole fleet
+
+    Every host's samples go into per-host SampleRings. A fleet alert is
+    raised when at least alert_share percent of the hosts heard from within
+    stale_after seconds are at or above a level on a resource. Hosts silent
+    for forget_after seconds are dropped, and datagrams from new hosts are
+    ignored while max_hosts hosts are known, so spoofed host IDs cannot
+    grow the table without bound.
+
+    Attributes:
+        alert_share (float): Percent of hosts at a level raising a fleet
+            alert
+
+        capacity (int): Samples kept per host and resource
+
+        forget_after (float): Seconds after which a silent host is dropped
+
+        hosts (dict): Maps host ID to HostState
+
+        listen (tuple): (host, port) the aggregator binds to
+
+        max_hosts (int): Maximum number of hosts tracked
+
+        stale_after (float): Seconds after which a silent host no longer
+            counts toward the fleet
+    """
+
+    def __init__(self, listen, capacity=60, alert_share=30.0,
+                 stale_after=180.0, forget_after=3600.0, max_hosts=10000):
+        """Describe the aggregator, open must be called before use
+
+        Args:
+            listen (str): 'host:port' to bind to
+
+            capacity (int): Samples kept per host and resource
+
+            alert_share (float): Percent of hosts at a level raising a
+                fleet alert
+
+            stale_after (float): Seconds after which a silent host no
+                longer counts toward the fleet
+
+            forget_after (float): Seconds after which a silent host is
+                dropped
+
+            max_hosts (int): Maximum number of hosts tracked
+        """
+
+        self.active = {}  # Maps (resource, level) to raised FleetAlert
+        self.alert_share = alert_share
+        self.buffer = bytearray(65536)
+        self.capacity = capacity
+        self.forget_after = forget_after
+        self.hosts = {}
+        self.ignored = 0  # Datagrams from new hosts dropped while full
+        self.listen = parse_address(listen)
+        self.max_hosts = max_hosts
+        self.socket = None
+        self.stale_after = stale_after
+
+    def open(self):
+        """Bind the receiving socket"""
+
+        family, kind, protocol, _, address = socket.getaddrinfo(
+                self.listen[0], self.listen[1], 0, socket.SOCK_DGRAM)[0]
+        self.socket = socket.socket(family, kind, protocol)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4194304)
+        self.socket.bind(address)
+        self.socket.setblocking(False)
+
+    def close(self):
+        """Close the receiving socket"""
+
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def ingest(self, datagram, now):
+        """Apply one datagram
+
+        Args:
+            datagram (memoryview): Received datagram
+
+            now (float): Current monotonic time in seconds
+
+        Returns:
+            list: (host ID, timestamp, resource, level, value) tuples of
+                alerts raised by the host, malformed datagrams are ignored
+        """
+
+        if len(datagram) < HEADER.size:
+            return []
+        magic, version, count, host_id = HEADER.unpack_from(datagram)
+        end = HEADER.size + count * RECORD.size
+        if magic != MAGIC or version != VERSION or len(datagram) < end:
+            return []
+        host_id = host_id.rstrip(b'\0').decode('utf-8', 'replace')
+        host = self.hosts.get(host_id)
+        if host is None:
+            if len(self.hosts) >= self.max_hosts:
+                self.ignored += 1
+                return []
+            host = self.hosts[host_id] = HostState(self.capacity)
+        host.last_seen = now
+        alerts = []
+        for timestamp, kind, resource, level, value in RECORD.iter_unpack(
+                datagram[HEADER.size:end]):
+            if resource >= len(RESOURCES) or level >= len(LEVELS):
+                continue
+            resource = RESOURCES[resource]
+            if kind == KIND_SAMPLE:
+                host.samples[resource].add(timestamp, value)
+                host.levels[resource] = level
+            elif kind == KIND_ALERT:
+                alerts.append((host_id, timestamp, resource, LEVELS[level],
+                               value))
+        return alerts
+
+    def receive(self, now):
+        """Read every datagram waiting on the socket
+
+        Args:
+            now (float): Current monotonic time in seconds
+
+        Returns:
+            list: Host alerts as returned by ingest
+        """
+
+        alerts = []
+        view = memoryview(self.buffer)
+        while True:
+            try:
+                length = self.socket.recv_into(self.buffer)
+            except BlockingIOError:
+                return alerts
+            alerts.extend(self.ingest(view[:length], now))
+
+    def prune(self, now):
+        """Drop hosts silent for longer than forget_after seconds
+
+        Args:
+            now (float): Current monotonic time in seconds
+
+        Returns:
+            list: IDs of the dropped hosts
+        """
+
+        silent = [host_id for host_id, host in self.hosts.items()
+                  if now - host.last_seen > self.forget_after]
+        for host_id in silent:
+            del self.hosts[host_id]
+        return silent
+
+    def evaluate(self, now):
+        """Fleet alerts currently warranted
+
+        Args:
+            now (float): Current monotonic time in seconds
+
+        Returns:
+            list: FleetAlert of each resource and level reached by at least
+                alert_share percent of live hosts, Critical first
+        """
+
+        live = [host for host in self.hosts.values()
+                if now - host.last_seen <= self.stale_after]
+        alerts = []
+        if not live:
+            return alerts
+        for resource in RESOURCES:
+            for level in range(len(LEVELS) - 1, 0, -1):
+                hosts = sum(1 for host in live
+                            if host.levels[resource] >= level)
+                if hosts * 100.0 / len(live) >= self.alert_share:
+                    alerts.append(FleetAlert(resource, LEVELS[level], hosts,
+                                             len(live)))
+                    break  # Lower levels are implied
+        return alerts
+
+    def serve(self, check_delay):
+        """Receive and alert forever
+
+        Host alerts are logged as they arrive; fleet alerts are logged when
+        raised and when cleared, evaluated every check_delay seconds.
+
+        Args:
+            check_delay (float): Seconds between fleet evaluations
+        """
+
+        info_logger = logging.getLogger('info_logger')
+        next_check = time.monotonic() + check_delay
+        while True:
+            timeout = max(next_check - time.monotonic(), 0.0)
+            readable = select.select([self.socket], [], [], timeout)[0]
+            now = time.monotonic()
+            if readable:
+                for host_id, _, resource, level, value in self.receive(now):
+                    info_logger.info('Host {0}: {1} Usage {2}: {3:.1f}%'
+                                     .format(host_id, resource, level,
+                                             value))
+            if now < next_check:
+                continue
+            next_check = now + check_delay
+            for host_id in self.prune(now):
+                info_logger.info('Host {0} silent for over {1} sec: '
+                                 'forgotten'.format(host_id,
+                                                    str(self.forget_after)))
+            if self.ignored:
+                logging.getLogger('warning_logger').warning(
+                        'Fleet host table full ({0} hosts): ignored {1} '
+                        'datagrams from new hosts'.format(
+                                str(self.max_hosts), str(self.ignored)))
+                self.ignored = 0
+            self.report(self.evaluate(now))
+
+    def report(self, alerts):
+        """Log fleet alerts that were raised or cleared
+
+        Args:
+            alerts (list): FleetAlert list returned by evaluate
+        """
+
+        current = dict(((alert.resource, alert.level), alert)
+                       for alert in alerts)
+        for key, alert in current.items():
+            if key in self.active:
+                continue
+            message = 'Fleet {0} {1}: {2:.1f}% of nodes above {0} {3} ' \
+                      '({4} of {5})'.format(alert.resource, alert.level,
+                                            alert.hosts * 100.0 / alert.total,
+                                            alert.level.lower(),
+                                            str(alert.hosts),
+                                            str(alert.total))
+            if alert.level == 'Critical':
+                logging.getLogger('critical_logger').critical(message)
+            else:
+                logging.getLogger('warning_logger').warning(message)
+        for resource, level in set(self.active).difference(current):
+            logging.getLogger('info_logger').info(
+                    'Fleet {0} {1} cleared'.format(resource, level))
+        self.active = current
+
+
+def simulate(host_id, address):
+    """Push random samples as a single host would, forever
+
+    Args:
+        host_id (str): Name of the simulated host
+
+        address (str): 'host:port' of the aggregator
+    """
+
+    sender = FleetSender(address, host_id)
+    busy = random.random() < 0.4  # Some hosts run hot
+    while True:
+        now = time.time()
+        for resource in RESOURCES:
+            value = random.uniform(85.0, 99.0) if busy \
+                else random.uniform(5.0, 60.0)
+            level = 'Critical' if value >= 95.0 else \
+                'Warning' if value >= 85.0 else None
+            sender.sample(now, resource, value, level)
+            if level is not None:
+                sender.alert(now, resource, level, value)
+        sender.flush()
+        time.sleep(1.0)
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(format='%(asctime)s %(message)s',
+                        level=logging.INFO, stream=sys.stdout)
+    if len(sys.argv) < 2 or sys.argv[1] not in ('aggregate', 'simulate'):
+        sys.exit(__doc__)
+    if sys.argv[1] == 'aggregate':
+        aggregator = FleetAggregator(sys.argv[2] if len(sys.argv) > 2
+                                     else DEFAULT_ADDRESS)
+        aggregator.open()
+        aggregator.serve(5.0)
+    else:
+        fleet_address = sys.argv[3] if len(sys.argv) > 3 \
+            else DEFAULT_ADDRESS
+        processes = [multiprocessing.Process(
+                target=simulate, args=('host{0}'.format(str(i)),
+                                       fleet_address))
+                for i in range(int(sys.argv[2]))]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
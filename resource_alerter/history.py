@@ -0,0 +1,339 @@
+#! /usr/bin/env python
+
+"""Circular, memory-mapped on-disk history of resource usage samples
+
+Copyright:
+
+    history.py store resource usage samples on disk
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import mmap
+import os
+import struct
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Metric stored in each slot of a record, new metrics are appended so that
+# existing history files stay readable
+METRICS = ('cpu', 'ram')
+
+# Header: magic, format version, record size, metric slots, capacity and
+# total number of records ever written, padded to HEADER_SIZE bytes
+HEADER = struct.Struct('<8sIIIIQ')
+HEADER_SIZE = 64
+WRITTEN = struct.Struct('<Q')  # Last field of HEADER, updated per append
+WRITTEN_OFFSET = HEADER.size - WRITTEN.size
+MAGIC = b'RAHIST\x00\x00'
+VERSION = 1
+
+
+class HistoryStore:
+    """Fixed-size file of fixed-width sample records used as a ring buffer
+
+    Each record is a float64 timestamp followed by a float32 per metric
+    slot, NaN where a metric was not sampled. The file is preallocated and
+    memory-mapped, so appending is a single struct.pack_into and the file
+    never grows. Reads return views into the mapping without copying.
+
+    Only the daemon opens the file for writing. Other processes open it
+    read-only, taking the layout from the file, so they never modify or
+    resize it under the daemon.
+
+    Attributes:
+        capacity (int): Number of records kept before the oldest is
+            overwritten
+
+        path (str): Path to the history file
+
+        readonly (bool): True if opened for reading only
+
+        record (Struct): Layout of a single record
+
+        slots (int): Number of metric slots per record
+    """
+
+    def __init__(self, path, capacity=None, slots=8):
+        """Describe a history file, open must be called before use
+
+        Args:
+            path (str): Path to the history file
+
+            capacity (int): Number of records kept, required unless the
+                file is opened read-only
+
+            slots (int): Number of metric slots per record, at least
+                len(METRICS), taken from the file if opened read-only
+        """
+
+        self.capacity = None if capacity is None else int(capacity)
+        self.map = None
+        self.path = path
+        self.readonly = False
+        self.record = struct.Struct('<d{0}f'.format(int(slots)))
+        self.slots = int(slots)
+        self.written = 0
+        self._padding = (float('nan'),) * self.slots
+
+    def open(self, readonly=False):
+        """Map the history file
+
+        For writing, a file of the same record layout and capacity is
+        reused, so the history survives restarts; any other file is
+        replaced by a new, empty one. The new file is built under a
+        temporary name and renamed over path, so processes still mapping
+        the old file keep reading it instead of faulting.
+
+        For reading, capacity and record layout are taken from the file,
+        which is never modified.
+
+        Args:
+            readonly (bool): Open for reading only
+
+        Raises:
+            ValueError: If opened read-only and path is not a history file
+                of this version
+        """
+
+        if readonly:
+            self._open_readonly()
+            return
+        size = HEADER_SIZE + self.capacity * self.record.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            expected = (MAGIC, VERSION, self.record.size, self.slots,
+                        self.capacity)
+            if len(header) == HEADER.size and \
+                    HEADER.unpack(header)[:5] == expected and \
+                    os.fstat(fd).st_size == size:
+                self.written = HEADER.unpack(header)[5]
+            else:
+                if header:
+                    logging.getLogger('warning_logger').warning(
+                            '{0} does not hold {1} records of {2} slots: '
+                            'discarding its history'.format(
+                                    self.path, str(self.capacity),
+                                    str(self.slots)))
+                old_fd, fd = fd, self._create(size)
+                os.close(old_fd)
+                self.written = 0
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)  # The mapping holds its own reference
+        self.readonly = False
+
+    def _create(self, size):
+        """Replace the history file with an empty one
+
+        Args:
+            size (int): Size of the file in bytes
+
+        Returns:
+            int: File descriptor of the new file, open for reading and
+                writing
+        """
+
+        temporary_path = '{0}.{1}'.format(self.path, str(os.getpid()))
+        fd = os.open(temporary_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC,
+                     0o644)
+        try:
+            os.ftruncate(fd, size)  # Preallocate, zero filled
+            os.pwrite(fd, HEADER.pack(MAGIC, VERSION, self.record.size,
+                                      self.slots, self.capacity, 0), 0)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            os.close(fd)
+            raise
+        return fd
+
+    def _open_readonly(self):
+        """Map the history file for reading, layout taken from its header"""
+
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            if len(header) < HEADER.size or \
+                    HEADER.unpack(header)[:2] != (MAGIC, VERSION):
+                raise ValueError('{0} is not a version {1} history '
+                                 'file'.format(self.path, str(VERSION)))
+            _, _, record_size, slots, capacity, written = \
+                HEADER.unpack(header)
+            record = struct.Struct('<d{0}f'.format(str(slots)))
+            size = HEADER_SIZE + capacity * record.size
+            if record.size != record_size or os.fstat(fd).st_size < size:
+                raise ValueError('{0} is truncated or corrupt'.format(
+                        self.path))
+            self.map = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)  # The mapping holds its own reference
+        self.capacity = capacity
+        self.readonly = True
+        self.record = record
+        self.slots = slots
+        self.written = written
+        self._padding = (float('nan'),) * self.slots
+
+    def close(self):
+        """Flush and unmap the history file"""
+
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+
+    def append(self, timestamp, values):
+        """Write a record, overwriting the oldest one if full
+
+        Args:
+            timestamp (float): Seconds since Epoch
+
+            values (tuple): Metric values in METRICS order, may be shorter
+                than slots
+        """
+
+        index = self.written % self.capacity
+        self.record.pack_into(self.map,
+                              HEADER_SIZE + index * self.record.size,
+                              timestamp,
+                              *(values + self._padding[len(values):]))
+        self.written += 1
+        WRITTEN.pack_into(self.map, WRITTEN_OFFSET, self.written)
+
+    def __len__(self):
+        """Number of records currently stored"""
+
+        return min(self.written, self.capacity)
+
+    def _physical(self, position):
+        """Physical record index of the position-th oldest record"""
+
+        first = self.written - len(self)
+        return (first + position) % self.capacity
+
+    def _timestamp(self, position):
+        """Timestamp of the position-th oldest record"""
+
+        return struct.unpack_from('<d', self.map,
+                                  HEADER_SIZE + self._physical(position)
+                                  * self.record.size)[0]
+
+    def _bisect(self, timestamp):
+        """Position of the oldest record not older than timestamp"""
+
+        low = 0
+        high = len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def segments(self, start=None, end=None):
+        """Raw records between two times as zero-copy memoryviews
+
+        Records wrap around the end of the file, so a range is returned as
+        at most two contiguous segments in chronological order.
+
+        Args:
+            start (float): Earliest timestamp included, defaults to the
+                oldest record
+
+            end (float): Latest timestamp excluded, defaults to after the
+                newest record
+
+        Returns:
+            list: memoryviews of whole records, oldest first
+        """
+
+        if self.readonly:  # Pick up records the daemon appended since
+            self.written = WRITTEN.unpack_from(self.map, WRITTEN_OFFSET)[0]
+        first = 0 if start is None else self._bisect(start)
+        last = len(self) if end is None else self._bisect(end)
+        if first >= last:
+            return []
+        size = self.record.size
+        view = memoryview(self.map)[HEADER_SIZE:]
+        physical_first = self._physical(first)
+        physical_last = self._physical(last - 1) + 1
+        if physical_first < physical_last:
+            return [view[physical_first * size:physical_last * size]]
+        return [view[physical_first * size:self.capacity * size],
+                view[:physical_last * size]]
+
+    def records(self, start=None, end=None):
+        """Iterate over records between two times
+
+        Args:
+            start (float): Earliest timestamp included
+
+            end (float): Latest timestamp excluded
+
+        Yields:
+            tuple: (timestamp, value of each slot)
+        """
+
+        for segment in self.segments(start, end):
+            for record in self.record.iter_unpack(segment):
+                yield record
+
+    def dtype(self):
+        """NumPy structured dtype matching a record
+
+        Returns:
+            numpy.dtype: 'time' field followed by one field per slot, named
+                after METRICS where known
+
+        Raises:
+            ImportError: If NumPy is not installed
+        """
+
+        try:
+            import numpy  # Optional, only loaded by readers asking for it
+        except ImportError:
+            raise ImportError('NumPy is required for array views of history')
+        names = list(METRICS) + ['slot{0}'.format(str(i)) for i in
+                                 range(len(METRICS), self.slots)]
+        return numpy.dtype([('time', '<f8')] +
+                           [(name, '<f4') for name in names[:self.slots]])
+
+    def arrays(self, start=None, end=None):
+        """Records between two times as zero-copy NumPy structured arrays
+
+        Args:
+            start (float): Earliest timestamp included
+
+            end (float): Latest timestamp excluded
+
+        Returns:
+            list: At most two read-only structured arrays, oldest first
+
+        Raises:
+            ImportError: If NumPy is not installed
+        """
+
+        dtype = self.dtype()
+        import numpy  # Loaded by dtype
+        return [numpy.frombuffer(segment, dtype=dtype) for segment in
+                self.segments(start, end)]
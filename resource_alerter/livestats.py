@@ -0,0 +1,183 @@
+#! /usr/bin/env python
+
+"""Publishes the last resource check in a memory-mapped file
+
+Local tools that poll usage many times per second, e.g. shell prompts,
+map the file and copy a few dozen bytes instead of reading /proc or
+asking the daemon. This module imports nothing beyond the standard
+library so that readers start quickly.
+
+Copyright:
+
+    livestats.py share resource_alerterd samples through a mapped file
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import mmap
+import os
+import struct
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Header: magic, format version, payload size and the sequence number of
+# the seqlock, 8-byte aligned so it is stored in one write
+HEADER = struct.Struct('<8sIIQ')
+SEQUENCE = struct.Struct('<Q')
+SEQUENCE_OFFSET = HEADER.size - SEQUENCE.size
+MAGIC = b'RALIVE\x00\x00'
+VERSION = 1
+
+# Start of the check in seconds since Epoch and PID of the daemon, then per
+# metric its sample time, usage and EWMA in percent, alert level and the
+# configured warning and critical levels, then the number of active cgroup,
+# core and user alerts. Missing values are NaN.
+PAYLOAD = struct.Struct('<dI' + 'dddBdd' * 2 + 'HBH')
+FIELDS = ('time', 'pid',
+          'cpu_time', 'cpu_percent', 'cpu_ewma', 'cpu_level',
+          'cpu_warning_level', 'cpu_critical_level',
+          'ram_time', 'ram_percent', 'ram_ewma', 'ram_level',
+          'ram_warning_level', 'ram_critical_level',
+          'cgroup_alerts', 'core_alerts', 'user_alerts')
+
+# Alert levels by their code in the payload
+LEVELS = (None, 'Warning', 'Critical')
+
+SIZE = HEADER.size + PAYLOAD.size
+
+
+class LiveStats:
+    """Writer of the live stats file, guarded by a seqlock
+
+    The sequence number is made odd before the payload is written and even
+    after, so a reader that sees the same even number before and after
+    copying the payload holds one consistent check. The writer never waits
+    on readers and readers never block the writer.
+
+    Attributes:
+        path (str): Path of the live stats file
+
+        sequence (int): Sequence number last written
+    """
+
+    def __init__(self, path):
+        """Describe the file, open must be called before publishing
+
+        Args:
+            path (str): Path of the live stats file
+        """
+
+        self.map = None
+        self.path = path
+        self.sequence = 0
+
+    def open(self):
+        """Create and map a new file, replacing any previous one
+
+        The file is built under a temporary name and renamed over path, so
+        readers never map a file of the wrong size.
+        """
+
+        temporary_path = '{0}.{1}'.format(self.path, str(os.getpid()))
+        fd = os.open(temporary_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC,
+                     0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self.map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)  # The mapping holds its own reference
+        self.sequence = 0
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, PAYLOAD.size, 0)
+        os.replace(temporary_path, self.path)
+
+    def close(self):
+        """Unmap the file, left in place for readers to see the last check"""
+
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def publish(self, values):
+        """Replace the payload, does nothing until the file is opened
+
+        Args:
+            values (tuple): Values in FIELDS order
+        """
+
+        if self.map is None:
+            return
+        self.sequence += 1
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, self.sequence)
+        PAYLOAD.pack_into(self.map, HEADER.size, *values)
+        self.sequence += 1
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, self.sequence)
+
+
+def read(path, attempts=1000):
+    """Read a consistent copy of the live stats file
+
+    Args:
+        path (str): Path of the live stats file
+
+        attempts (int): Copies tried, 0.1 ms apart, while the daemon is
+            writing before giving up
+
+    Returns:
+        dict: Maps FIELDS to values, levels as names, None for missing
+            values; None if nothing was published yet
+
+    Raises:
+        ValueError: If the file is not a live stats file of this version or
+            stayed busy for every attempt
+    """
+
+    with open(path, 'rb') as live_file:
+        live_map = mmap.mmap(live_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if len(live_map) < SIZE:
+            raise ValueError('{0} is too short'.format(path))
+        magic, version, payload_size, _ = HEADER.unpack_from(live_map, 0)
+        if magic != MAGIC or version != VERSION or \
+                payload_size != PAYLOAD.size:
+            raise ValueError('{0} is not a version {1} live stats '
+                             'file'.format(path, str(VERSION)))
+        for _ in range(attempts):
+            before = SEQUENCE.unpack_from(live_map, SEQUENCE_OFFSET)[0]
+            if not before & 1:  # Not being written
+                payload = live_map[HEADER.size:SIZE]
+                if SEQUENCE.unpack_from(live_map,
+                                        SEQUENCE_OFFSET)[0] == before:
+                    break
+            time.sleep(0.0001)  # Let a preempted writer finish
+        else:
+            raise ValueError('{0} stayed busy for {1} attempts'.format(
+                    path, str(attempts)))
+    finally:
+        live_map.close()
+    if not before:
+        return None
+    stats = dict(zip(FIELDS, PAYLOAD.unpack(payload)))
+    for field, value in stats.items():
+        if field in ('cpu_level', 'ram_level'):
+            stats[field] = LEVELS[value] if value < len(LEVELS) else None
+        elif isinstance(value, float) and value != value:  # NaN
+            stats[field] = None
+    return stats
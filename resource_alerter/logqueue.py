@@ -0,0 +1,206 @@
+#! /usr/bin/env python
+
+"""Moves log formatting and file writes off the monitoring loop
+
+Copyright:
+
+    logqueue.py write logs from a background thread
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import atexit
+import logging.handlers
+import queue
+import threading
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+_STOP = object()  # Sentinel telling the listener thread to exit
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records untouched so they are formatted by the listener
+
+    QueueHandler formats records before queueing them, i.e. on the logging
+    thread, which is exactly the work this handler exists to move.
+    """
+
+    def prepare(self, record):
+        """Return record as is, formatting is left to the listener"""
+
+        return record
+
+
+class BatchingLogListener:
+    """Formats each record once and writes it to all of its log files
+
+    Replaces the handlers of the given loggers with queue handlers. A
+    background thread formats each record once per distinct formatter,
+    appends it to a buffer per destination handler and writes the buffers
+    when flush_interval seconds pass or flush_bytes characters accumulate.
+    RotatingFileHandler limits are honored. Buffers are flushed at exit.
+
+    Attributes:
+        flush_bytes (int): Number of buffered characters forcing a write
+
+        flush_interval (float): Maximum seconds a record stays buffered
+
+        flush_timings (PhaseHistogram): Records how long each flush takes,
+            None to not time flushes
+
+        handlers (list): Original handlers of all loggers, without repeats
+
+        queue (Queue): Records awaiting formatting
+
+        routes (dict): Maps logger names to their original handlers
+    """
+
+    def __init__(self, loggers, flush_interval=1.0, flush_bytes=65536):
+        """Re-route loggers through a queue, start must be called to write
+
+        Args:
+            loggers (list): Loggers whose handlers should be replaced
+
+            flush_interval (float): Maximum seconds a record stays buffered
+
+            flush_bytes (int): Number of buffered characters forcing a write
+        """
+
+        self.buffers = {}
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.flush_timings = None
+        self.handlers = []
+        self.queue = queue.Queue()
+        self.routes = {}
+        self.thread = None
+
+        queue_handler = DeferredQueueHandler(self.queue)
+        for logger in loggers:
+            self.routes[logger.name] = list(logger.handlers)
+            for handler in self.routes[logger.name]:
+                logger.removeHandler(handler)
+                if handler not in self.handlers:
+                    self.handlers.append(handler)
+                    self.buffers[handler] = []
+            logger.addHandler(queue_handler)
+
+    def start(self):
+        """Start the thread writing queued records"""
+
+        self.thread = threading.Thread(target=self._run, name='log_listener')
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write every queued record and stop the listener thread"""
+
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+
+    def flush(self):
+        """Write all buffered records to their handlers"""
+
+        start = time.perf_counter_ns()
+        for handler, lines in self.buffers.items():
+            if lines:
+                self.write(handler, ''.join(lines))
+                del lines[:]
+        if self.flush_timings is not None:
+            self.flush_timings.record(time.perf_counter_ns() - start)
+
+    @staticmethod
+    def write(handler, data):
+        """Write data to handler's stream, rolling files over as needed
+
+        Args:
+            handler (Handler): StreamHandler or subclass to write to
+
+            data (str): Formatted records, including terminators
+        """
+
+        handler.acquire()
+        try:
+            if handler.stream is None:  # Closed by a previous rollover
+                handler.stream = handler._open()
+            max_bytes = getattr(handler, 'maxBytes', 0)
+            if max_bytes > 0:
+                handler.stream.seek(0, 2)  # Non-posix-compliant Windows
+                if handler.stream.tell() + len(data) >= max_bytes:
+                    handler.doRollover()
+            handler.stream.write(data)
+            handler.stream.flush()
+        except Exception:
+            handler.handleError(None)
+        finally:
+            handler.release()
+
+    def _buffer(self, record):
+        """Format record once and buffer it for each of its handlers
+
+        Args:
+            record (LogRecord): Record to buffer
+
+        Returns:
+            int: Number of characters buffered
+        """
+
+        buffered = 0
+        formatted = {}  # Maps id of formatter to text
+        for handler in self.routes.get(record.name, ()):
+            if record.levelno < handler.level or not handler.filter(record):
+                continue
+            if not hasattr(handler, 'stream'):  # Not file-like, no batching
+                handler.handle(record)
+                continue
+            key = id(handler.formatter)
+            text = formatted.get(key)
+            if text is None:
+                text = handler.format(record) + handler.terminator
+                formatted[key] = text
+            self.buffers[handler].append(text)
+            buffered += len(text)
+        return buffered
+
+    def _run(self):
+        """Buffer queued records and write them in batches until stopped"""
+
+        buffered = 0
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(
+                        timeout=max(next_flush - time.monotonic(), 0.0))
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                self.flush()
+                return
+            if record is not None:
+                buffered += self._buffer(record)
+            if buffered >= self.flush_bytes or \
+                    time.monotonic() >= next_flush:
+                self.flush()
+                buffered = 0
+                next_flush = time.monotonic() + self.flush_interval
@@ -0,0 +1,280 @@
+#! /usr/bin/env python
+
+"""Serves the latest resource check in Prometheus text format
+
+Copyright:
+
+    metrics.py serve resource_alerterd metrics to Prometheus
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import math
+import os
+import socket
+import stat
+import threading
+
+from resource_alerter.fleet import parse_address
+from resource_alerter.selfstats import BUCKETS
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+error_logger = logging.getLogger('error_logger')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Phase histograms are exported from 2**10 ns (about 1 us) up, finer
+# buckets are folded into the first
+FIRST_BUCKET = 10
+
+# Longest request read before answering, scrapers send a few hundred bytes
+MAX_REQUEST = 8192
+
+
+def http_response(body, status='200 OK'):
+    """Complete HTTP/1.0 response carrying a metrics page
+
+    Args:
+        body (bytes): Response body
+
+        status (str): Status line after the protocol version
+
+    Returns:
+        bytes: Status line, headers and body
+    """
+
+    return 'HTTP/1.0 {0}\r\nContent-Type: {1}\r\nContent-Length: {2}\r\n' \
+           'Connection: close\r\n\r\n'.format(
+                   status, CONTENT_TYPE, str(len(body))).encode() + body
+
+
+def format_value(value):
+    """Format a sample value as the text format expects
+
+    Args:
+        value (float): Value, None for a missing value
+
+    Returns:
+        str: Value, NaN if missing
+    """
+
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 'NaN'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsPage:
+    """Builds one scrape of metrics in Prometheus text format
+
+    Attributes:
+        lines (list): Lines of the page without terminators
+    """
+
+    def __init__(self):
+        """Start an empty page"""
+
+        self.lines = []
+
+    def metric(self, name, kind, description, samples):
+        """Add a metric family
+
+        Args:
+            name (str): Metric name
+
+            kind (str): 'gauge', 'counter' or 'histogram'
+
+            description (str): HELP text
+
+            samples (list): (suffix, labels, value) tuples, labels a tuple
+                of (label, value) pairs
+        """
+
+        self.lines.append('# HELP {0} {1}'.format(name, description))
+        self.lines.append('# TYPE {0} {1}'.format(name, kind))
+        for suffix, labels, value in samples:
+            if labels:
+                label_text = '{' + ','.join(
+                        '{0}="{1}"'.format(label, str(label_value).replace(
+                                '\\', '\\\\').replace('"', '\\"'))
+                        for label, label_value in labels) + '}'
+            else:
+                label_text = ''
+            self.lines.append('{0}{1}{2} {3}'.format(
+                    name, suffix, label_text, format_value(value)))
+
+    def histograms(self, name, description, label, histograms):
+        """Add PhaseHistograms as one histogram family in seconds
+
+        Args:
+            name (str): Metric name
+
+            description (str): HELP text
+
+            label (str): Label distinguishing the histograms
+
+            histograms (dict): Maps label values to PhaseHistogram
+        """
+
+        samples = []
+        for label_value, histogram in sorted(histograms.items()):
+            buckets = histogram.buckets.tolist()  # Copy, may be recording
+            cumulative = sum(buckets[:FIRST_BUCKET])
+            for index in range(FIRST_BUCKET, BUCKETS - 1):
+                cumulative += buckets[index]
+                samples.append(('_bucket', ((label, label_value),
+                                            ('le', repr(2 ** index / 1e9))),
+                                cumulative))
+            cumulative += buckets[BUCKETS - 1]
+            samples.append(('_bucket', ((label, label_value), ('le', '+Inf')),
+                            cumulative))
+            samples.append(('_sum', ((label, label_value),),
+                            histogram.total / 1e9))
+            samples.append(('_count', ((label, label_value),), cumulative))
+        self.metric(name, 'histogram', description, samples)
+
+    def render(self):
+        """Encode the page
+
+        Returns:
+            bytes: Page in Prometheus text format
+        """
+
+        return ('\n'.join(self.lines) + '\n').encode('utf-8')
+
+
+class MetricsServer:
+    """Answers every HTTP request with the last published metrics page
+
+    The page is rendered into a complete response once per resource check
+    and swapped in with a single assignment, so a scrape costs one write of
+    a prepared buffer and never waits on, or holds up, the resource checks.
+    Listens on TCP 'host:port' or, for a path starting with '/', a Unix
+    socket. Requests are served one at a time by a background thread.
+
+    Attributes:
+        listen (str): Address listened on
+
+        response (bytes): Complete HTTP response served to every request
+
+        socket (socket): Listening socket, None until opened
+
+        timeout (float): Seconds a client may take to send its request and
+            read the response
+    """
+
+    def __init__(self, listen, timeout=1.0):
+        """Describe the listener, open binds it and start serves it
+
+        Args:
+            listen (str): 'host:port' or path of a Unix socket
+
+            timeout (float): Seconds a client may take to send its request
+                and read the response
+        """
+
+        self.listen = listen
+        self.response = http_response(b'No resource check completed yet\n',
+                                      '503 Service Unavailable')
+        self.socket = None
+        self.thread = None
+        self.timeout = timeout
+
+    def open(self):
+        """Bind the listening socket, replacing a stale Unix socket"""
+
+        if self.listen.startswith('/'):
+            try:
+                if stat.S_ISSOCK(os.stat(self.listen).st_mode):
+                    os.remove(self.listen)
+            except OSError:  # No stale socket
+                pass
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.bind(self.listen)
+        else:
+            host, port = parse_address(self.listen)
+            family, kind, protocol, _, address = socket.getaddrinfo(
+                    host, port, 0, socket.SOCK_STREAM)[0]
+            self.socket = socket.socket(family, kind, protocol)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(address)
+        self.socket.listen(16)
+
+    def close(self):
+        """Close the listening socket"""
+
+        if self.socket is not None:
+            listener, self.socket = self.socket, None
+            try:
+                listener.shutdown(socket.SHUT_RDWR)  # Wakes accept
+            except OSError:
+                pass
+            listener.close()
+            if self.listen.startswith('/'):
+                try:
+                    os.remove(self.listen)
+                except OSError:
+                    pass
+
+    def publish(self, page):
+        """Serve a new page from now on
+
+        Args:
+            page (bytes): Metrics in Prometheus text format
+        """
+
+        self.response = http_response(page)
+
+    def start(self):
+        """Start the thread answering requests"""
+
+        self.thread = threading.Thread(target=self.serve, name='metrics')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        """Answer requests until the listening socket is closed"""
+
+        listener = self.socket
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:  # Closed, or the client gave up
+                if self.socket is None:
+                    return
+                continue
+            try:
+                connection.settimeout(self.timeout)
+                request = b''
+                while b'\r\n\r\n' not in request and \
+                        len(request) < MAX_REQUEST:
+                    data = connection.recv(4096)
+                    if not data:
+                        break
+                    request += data
+                connection.sendall(self.response)
+            except OSError as error:
+                error_logger.error('Cannot serve metrics request: '
+                                   '{0}'.format(str(error)))
+            finally:
+                connection.close()
@@ -0,0 +1,345 @@
+#! /usr/bin/env python
+
+"""Broadcasts high resource usage alerts off the monitoring loop
+
+Copyright:
+
+    notify.py broadcast high resource usage alerts
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+import queue
+import re
+import select
+import socket
+import stat
+import struct
+import subprocess
+import threading
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+error_logger = logging.getLogger('error_logger')
+info_logger = logging.getLogger('info_logger')
+
+# Alert levels from least to most severe
+LEVELS = ('Warning', 'Critical')
+
+# Login records as laid out by glibc on Linux: ut_type, padding, ut_pid,
+# ut_line, ut_id, ut_user, ut_host, ut_exit, ut_session, ut_tv, ut_addr_v6
+# and reserved bytes
+UTMP_PATH = '/var/run/utmp'
+UTMP_RECORD = struct.Struct('=hxxi32s4s32s256shhiii4i20s')
+USER_PROCESS = 7
+
+# Terminal lines broadcast to, utmp is writable by the utmp group so any
+# other line could point the daemon at a disk or memory device
+TERMINAL_LINE = re.compile(r'(?:pts/[0-9]+|tty[0-9]+)\Z')
+
+
+def wall_broadcast(message, timeout=10.0):
+    """Broadcasts message via the program 'wall', logs error if it cannot
+
+    Args:
+        message (str): Message to broadcast
+
+        timeout (float): Seconds to wait for 'wall' before killing it
+    """
+
+    try:
+        info_logger.info('Attempting broadcast')
+        subprocess.call(['wall', message], timeout=timeout)
+        info_logger.info('Broadcast successful')
+    except (OSError, subprocess.TimeoutExpired) as error:
+        info_logger.info('Broadcast unsuccessful: see error log for more info')
+        error_message = '{0}: Cannot send broadcast via the program ' \
+                        '"wall"'.format(error)
+        error_logger.error(error_message)
+
+
+class TtyBroadcaster:
+    """Writes broadcasts straight to the terminals of logged in users
+
+    Replaces forking the program 'wall', which is most likely to fail with
+    ENOMEM precisely when RAM usage is critical. Logins are parsed from utmp
+    and cached until its modification time changes. Each terminal is
+    written without blocking and given up on after a timeout so a stuck
+    terminal cannot hold up the others.
+
+    Attributes:
+        hostname (str): Host name shown in the broadcast banner
+
+        terminals (list): Device paths of the terminals of logged in users
+
+        timeout (float): Seconds to wait for each terminal to accept the
+            whole broadcast
+
+        utmp_path (str): Path to the utmp login records
+    """
+
+    def __init__(self, utmp_path=UTMP_PATH, timeout=1.0):
+        """Initialize broadcaster, logins are read on first broadcast
+
+        Args:
+            utmp_path (str): Path to the utmp login records
+
+            timeout (float): Seconds to wait for each terminal to accept the
+                whole broadcast
+        """
+
+        self.hostname = socket.gethostname()
+        self.terminals = []
+        self.timeout = timeout
+        self.utmp_path = utmp_path
+        self._utmp_mtime = None
+
+    def available(self):
+        """Determine if login records can be read
+
+        Returns:
+            bool: True if utmp is readable
+        """
+
+        return os.access(self.utmp_path, os.R_OK)
+
+    def refresh(self):
+        """Re-read utmp if it has changed since it was last read"""
+
+        mtime = os.stat(self.utmp_path).st_mtime_ns
+        if mtime == self._utmp_mtime:
+            return
+        terminals = []
+        with open(self.utmp_path, 'rb') as utmp_file:
+            data = utmp_file.read()
+        usable = len(data) - len(data) % UTMP_RECORD.size
+        for record in UTMP_RECORD.iter_unpack(data[:usable]):
+            if record[0] != USER_PROCESS:
+                continue
+            line = record[2].split(b'\0', 1)[0].decode('ascii', 'replace')
+            if not TERMINAL_LINE.match(line):
+                continue  # Malformed or malicious record
+            terminal = '/dev/' + line
+            if terminal not in terminals:
+                terminals.append(terminal)
+        self.terminals = terminals
+        self._utmp_mtime = mtime
+        info_logger.info('Read {0} login terminals from {1}'.format(
+                str(len(terminals)), self.utmp_path))
+
+    def write_terminal(self, terminal, data):
+        """Write data to a terminal without blocking longer than timeout
+
+        Args:
+            terminal (str): Device path of the terminal
+
+            data (bytes): Bytes to write
+
+        Returns:
+            bool: True if all of data was written
+
+        Raises:
+            OSError: If terminal cannot be opened or is not a terminal
+        """
+
+        fd = os.open(terminal, os.O_WRONLY | os.O_NONBLOCK | os.O_NOCTTY |
+                     os.O_NOFOLLOW)
+        try:
+            if not stat.S_ISCHR(os.fstat(fd).st_mode) or not os.isatty(fd):
+                raise OSError('{0} is not a terminal'.format(terminal))
+            deadline = time.monotonic() + self.timeout
+            view = memoryview(data)
+            while view:
+                try:
+                    view = view[os.write(fd, view):]
+                except BlockingIOError:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0.0 or \
+                            not select.select([], [fd], [], remaining)[1]:
+                        return False
+            return True
+        finally:
+            os.close(fd)
+
+    def broadcast(self, message):
+        """Broadcasts message to every logged in user, logs failures
+
+        Args:
+            message (str): Message to broadcast
+        """
+
+        info_logger.info('Attempting broadcast')
+        try:
+            self.refresh()
+        except (IOError, OSError) as error:
+            info_logger.info(
+                    'Broadcast unsuccessful: see error log for more info')
+            error_logger.error('{0}: Cannot read logins from {1}'.format(
+                    error, self.utmp_path))
+            return
+        banner = 'Broadcast message from resource_alerterd@{0} ({1}):'.format(
+                self.hostname, time.strftime('%a %b %d %H:%M:%S %Y'))
+        text = '\r\n{0}\r\n\r\n{1}\r\n'.format(
+                banner, message.replace('\n', '\r\n'))
+        data = text.encode('utf-8', 'replace')
+        failures = 0
+        for terminal in self.terminals:
+            try:
+                if not self.write_terminal(terminal, data):
+                    failures += 1
+                    error_logger.error('Timed out broadcasting to '
+                                       '{0}'.format(terminal))
+            except (IOError, OSError) as error:
+                failures += 1
+                error_logger.error('{0}: Cannot broadcast to {1}'.format(
+                        error, terminal))
+        if failures:
+            info_logger.info('Broadcast unsuccessful on {0} of {1} '
+                             'terminals: see error log for more '
+                             'info'.format(str(failures),
+                                           str(len(self.terminals))))
+        else:
+            info_logger.info('Broadcast successful')
+
+
+class AlertDispatcher:
+    """Queues alerts and broadcasts them from a background thread
+
+    Alerts submitted during a resource check are merged into a single
+    message when the check is flushed. Messages go onto a bounded queue
+    drained by a worker thread, so a slow or hung broadcast never blocks the
+    monitoring loop; if the queue is full the message is dropped and logged.
+
+    Attributes:
+        broadcast (function): Called by the worker with each message
+
+        broadcast_timings (PhaseHistogram): Records how long each broadcast
+            takes, None to not time broadcasts
+
+        last_broadcast (dict): Maps alert levels to the monotonic time of
+            their last broadcast
+
+        pending (list): (resource, level, summary) tuples submitted since the
+            last flush
+
+        queue (Queue): Bounded queue of (level, message) tuples awaiting
+            broadcast
+
+        rate_limits (dict): Maps alert levels to the minimum number of
+            seconds between broadcasts at that level
+    """
+
+    def __init__(self, broadcast=wall_broadcast, queue_size=16,
+                 rate_limits=None):
+        """Initialize an empty dispatcher, start must be called to broadcast
+
+        Args:
+            broadcast (function): Called by the worker with each message
+
+            queue_size (int): Maximum number of messages awaiting broadcast
+
+            rate_limits (dict): Maps alert levels to the minimum number of
+                seconds between broadcasts at that level
+        """
+
+        self.broadcast = broadcast
+        self.broadcast_timings = None
+        self.last_broadcast = {}
+        self.pending = []
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.rate_limits = {} if rate_limits is None else rate_limits
+        self.worker = None
+
+    @staticmethod
+    def merge(alerts):
+        """Combine alerts of one resource check into a single message
+
+        Args:
+            alerts (list): (resource, level, summary) tuples
+
+        Returns:
+            tuple: (most severe level, message)
+        """
+
+        level = max((alert[1] for alert in alerts), key=LEVELS.index)
+        resources = []
+        for resource, _, _ in alerts:
+            if resource not in resources:
+                resources.append(resource)
+        lines = [alert[2] for alert in alerts]
+        lines.append('It is recommended that you do not start any {0} '
+                     'intensive processes at this '
+                     'time.'.format(' or '.join(resources)))
+        return level, '\n'.join(lines)
+
+    def submit(self, resource, level, summary):
+        """Add an alert to the message of the current resource check
+
+        Args:
+            resource (str): Resource with high usage, e.g. 'CPU'
+
+            level (str): Level of urgency, 'Warning' or 'Critical'
+
+            summary (str): Single line describing the usage
+        """
+
+        self.pending.append((resource, level, summary))
+
+    def flush(self):
+        """Queue alerts submitted since the last flush as one message"""
+
+        if not self.pending:
+            return
+        level, message = self.merge(self.pending)
+        self.pending = []
+        try:
+            self.queue.put_nowait((level, message))
+        except queue.Full:
+            error_logger.error('Broadcast queue full: dropping {0} '
+                               'broadcast'.format(level))
+
+    def start(self):
+        """Start the worker thread that broadcasts queued messages"""
+
+        self.worker = threading.Thread(target=self._drain,
+                                       name='alert_dispatcher')
+        self.worker.daemon = True
+        self.worker.start()
+
+    def _drain(self):
+        """Broadcast queued messages forever, honoring rate limits"""
+
+        while True:
+            level, message = self.queue.get()
+            now = time.monotonic()
+            last = self.last_broadcast.get(level)
+            if last is not None and \
+                    now - last < self.rate_limits.get(level, 0.0):
+                info_logger.info('{0} broadcast rate limit active: skipping '
+                                 'broadcast'.format(level))
+                continue
+            self.last_broadcast[level] = now
+            start = time.perf_counter_ns()
+            self.broadcast(message)
+            if self.broadcast_timings is not None:
+                self.broadcast_timings.record(time.perf_counter_ns() - start)
@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+
+"""Compact PID set compared incrementally between resource checks
+
+Copyright:
+
+    pidset.py compare PID lists between resource checks
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+
+class PidSet:
+    """Sorted integer array of PIDs with churn against the previous update
+
+    Each update merges the new PIDs against the previous ones in a single
+    linear pass, so comparing two PID lists costs O(n) instead of the O(n^2)
+    of a sequence matcher.
+
+    Attributes:
+        exited (array): PIDs present in the previous update but not in the
+            most recent one
+
+        pids (array): Sorted PIDs from the most recent update
+
+        similarity (float): Similarity, in percent, between the PIDs of the
+            two most recent updates
+
+        spawned (array): PIDs present in the most recent update but not in
+            the previous one
+    """
+
+    def __init__(self):
+        """Initialize an empty PID set"""
+
+        self.exited = array('i')
+        self.pids = array('i')
+        self.similarity = 0.0
+        self.spawned = array('i')
+
+    def update(self, new_pids):
+        """Replace PIDs with new_pids and compute churn and similarity
+
+        Args:
+            new_pids (list): PIDs of the current resource check, sorted lists
+                (as returned by psutil.pids()) avoid any re-ordering cost
+
+        Returns:
+            float: Similarity of the previous and current PIDs in percent,
+                twice the PIDs in common over the length of both lists as
+                difflib.SequenceMatcher.ratio() gives for sorted lists,
+                100.0 if both are empty
+        """
+
+        old = self.pids
+        new = array('i', sorted(new_pids))
+        exited = array('i')
+        spawned = array('i')
+        old_len = len(old)
+        new_len = len(new)
+        common = 0
+        i = 0
+        j = 0
+
+        # Linear merge of two sorted arrays
+        while i < old_len and j < new_len:
+            old_pid = old[i]
+            new_pid = new[j]
+            if old_pid == new_pid:
+                common += 1
+                i += 1
+                j += 1
+            elif old_pid < new_pid:
+                exited.append(old_pid)
+                i += 1
+            else:
+                spawned.append(new_pid)
+                j += 1
+        exited.extend(old[i:])
+        spawned.extend(new[j:])
+
+        total = old_len + new_len
+        self.similarity = 200.0 * common / total if total else 100.0
+        self.exited = exited
+        self.pids = new
+        self.spawned = spawned
+        return self.similarity
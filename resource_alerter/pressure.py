@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+
+"""Waits on kernel pressure stall information (PSI) triggers
+
+Copyright:
+
+    pressure.py wait on kernel pressure stall information triggers
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+from resource_alerter import procfs
+import select
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+error_logger = logging.getLogger('error_logger')
+
+# Resource names used by resource_alerterd mapped to PSI files under /proc
+PRESSURE_FILES = {'cpu': 'pressure/cpu', 'ram': 'pressure/memory'}
+
+
+class PressureMonitor:
+    """Blocks until a PSI trigger fires or a timeout expires
+
+    A trigger is registered on /proc/pressure/<resource> for each resource.
+    The kernel flags the trigger's file descriptor when tasks stall on that
+    resource for longer than the configured stall time within a window, so
+    waiting costs no CPU at all while the host is idle.
+
+    Attributes:
+        fds (dict): Maps open trigger file descriptors to resource names
+
+        triggers (dict): Maps resource names ('cpu', 'ram') to a tuple of
+            (stall time, window), both in microseconds
+    """
+
+    def __init__(self, triggers, proc_root=None):
+        """Store trigger settings, triggers are registered by open
+
+        Args:
+            triggers (dict): Maps resource names ('cpu', 'ram') to a tuple
+                of (stall time, window), both in microseconds
+
+            proc_root (str): Mount point of procfs, defaults to
+                procfs.PROC_ROOT
+        """
+
+        self.fds = {}
+        self.poller = None
+        self.proc_root = procfs.PROC_ROOT if proc_root is None else proc_root
+        self.triggers = triggers
+
+    def close(self):
+        """Unregister all triggers"""
+
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = {}
+        self.poller = None
+
+    def open(self):
+        """Register a PSI trigger for every configured resource
+
+        Returns:
+            bool: True if every trigger was registered, False if PSI is
+                unavailable, in which case no trigger remains registered
+        """
+
+        self.poller = select.poll()
+        for resource, (stall, window) in self.triggers.items():
+            path = os.path.join(self.proc_root, PRESSURE_FILES[resource])
+            trigger = 'some {0} {1}\0'.format(int(stall), int(window))
+            try:
+                fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+            except OSError as error:
+                error_logger.error('{0}: Cannot open PSI file {1}'.format(
+                        error, path))
+                self.close()
+                return False
+            self.fds[fd] = resource
+            try:
+                os.write(fd, trigger.encode('ascii'))
+            except OSError as error:
+                error_logger.error('{0}: Cannot register PSI trigger "{1}" '
+                                   'on {2}'.format(error, trigger[:-1], path))
+                self.close()
+                return False
+            self.poller.register(fd, select.POLLPRI)
+        return True
+
+    def wait(self, timeout):
+        """Block until a trigger fires or timeout seconds pass
+
+        Args:
+            timeout (float): Maximum time to block in seconds
+
+        Returns:
+            set: Names of resources whose trigger fired, empty on timeout
+        """
+
+        fired = set()
+        for fd, event in self.poller.poll(max(timeout, 0.0) * 1000.0):
+            if event & select.POLLERR:  # Monitored cgroup/file went away
+                self.poller.unregister(fd)  # Avoid waking up continuously
+                error_logger.error('PSI trigger for {0} reported an error: '
+                                   'trigger disabled'.format(self.fds[fd]))
+            elif event & select.POLLPRI:
+                fired.add(self.fds[fd])
+        return fired
@@ -0,0 +1,158 @@
+#! /usr/bin/env python
+
+"""Helpers for reading process information directly from /proc
+
+Copyright:
+
+    procfs.py read process information directly from /proc
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+PROC_ROOT = '/proc'
+
+# Per-process flag set by the kernel on kernel threads, see linux/sched.h
+PF_KTHREAD = 0x00200000
+
+# Indices into the fields of /proc/<pid>/stat following the command name,
+# i.e. field number (as listed in proc(5)) minus three
+STAT_STATE = 0
+STAT_PPID = 1
+STAT_FLAGS = 6
+STAT_UTIME = 11
+STAT_STIME = 12
+STAT_STARTTIME = 19
+STAT_RSS = 21
+
+
+def list_pids(proc_root=None):
+    """List the PIDs of every process, as psutil.pids() does on Linux
+
+    Args:
+        proc_root (str): Mount point of procfs, defaults to PROC_ROOT
+
+    Returns:
+        list: Sorted PIDs
+    """
+
+    proc_root = PROC_ROOT if proc_root is None else proc_root
+    return sorted(int(entry.name) for entry in os.scandir(proc_root)
+                  if entry.name.isdigit())
+
+
+def read_stat(pid, proc_root=None):
+    """Read and split /proc/<pid>/stat
+
+    The command name may contain spaces and parentheses, so the fields are
+    split after the last closing parenthesis.
+
+    Args:
+        pid (int): Process ID to read
+
+        proc_root (str): Mount point of procfs, defaults to PROC_ROOT
+
+    Returns:
+        list: Fields of /proc/<pid>/stat following the command name as
+            bytes, None if the process no longer exists
+    """
+
+    proc_root = PROC_ROOT if proc_root is None else proc_root
+    try:
+        with open('{0}/{1}/stat'.format(proc_root, pid), 'rb') as stat_file:
+            data = stat_file.read()
+    except (IOError, OSError):  # Process exited
+        return None
+    return data[data.rfind(b')') + 2:].split()
+
+
+class KernelThreadClassifier:
+    """Caches whether each process is a kernel thread for its lifetime
+
+    Processes are classified from the PF_KTHREAD flag in /proc/<pid>/stat
+    the first time they are seen and the result is reused until they exit,
+    so the per-check cost scales with process churn rather than with the
+    number of processes. A PID is forgotten as soon as a listing misses it,
+    so it is only misclassified if its process exits and the PID is reused
+    between two calls; ProcessScanner checks the flag again for every
+    process it reads.
+
+    Attributes:
+        cache (dict): Maps PID to True if kernel thread, else False, for
+            every process seen in the last call to non_kernel_pids
+
+        proc_root (str): Mount point of procfs
+    """
+
+    def __init__(self, proc_root=None):
+        """Initialize an empty classification cache
+
+        Args:
+            proc_root (str): Mount point of procfs, defaults to PROC_ROOT
+        """
+
+        self.cache = {}
+        self.proc_root = PROC_ROOT if proc_root is None else proc_root
+
+    def classify(self, pid):
+        """Read the kernel-thread flag of a single process
+
+        Args:
+            pid (int): Process ID to classify
+
+        Returns:
+            bool: True if kernel thread, else False, None if the process no
+                longer exists
+        """
+
+        fields = read_stat(pid, self.proc_root)
+        if fields is None:
+            return None
+        return bool(int(fields[STAT_FLAGS]) & PF_KTHREAD)
+
+    def non_kernel_pids(self, pids_list):
+        """Filter kernel threads out of pids_list, classifying only new PIDs
+
+        Entries of processes absent from pids_list are evicted.
+
+        Args:
+            pids_list (list): List of PIDs
+
+        Returns:
+            list: List of non-kernel PIDs in the order of pids_list
+        """
+
+        cache = self.cache
+        live = {}
+        non_kernel_pids = []
+        for pid in pids_list:
+            is_kernel = cache.get(pid)
+            if is_kernel is None:
+                is_kernel = self.classify(pid)
+                if is_kernel is None:  # Exited between listing and reading
+                    continue
+            live[pid] = is_kernel
+            if not is_kernel:
+                non_kernel_pids.append(pid)
+        self.cache = live  # Drops every process that has exited
+        return non_kernel_pids
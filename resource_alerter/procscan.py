@@ -0,0 +1,427 @@
+#! /usr/bin/env python
+
+"""Single-pass scan of per-process CPU and memory usage from /proc
+
+Copyright:
+
+    procscan.py scan per-process resource usage
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import os
+from resource_alerter import procfs
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# PID directories read per batch, one batch is one task of the thread pool
+BATCH_SIZE = 512
+
+
+def format_usage(value, unit):
+    """Format CPU or memory usage for logs and broadcasts
+
+    Args:
+        value (float): CPU usage in percent or memory in bytes
+
+        unit (str): '%' for CPU usage, 'MiB' for memory
+
+    Returns:
+        str: e.g. '97.0%' or '512.0MiB'
+    """
+
+    if unit == 'MiB':
+        value /= 1048576.0
+    return '{0:.1f}{1}'.format(value, unit)
+
+
+class ScanResult:
+    """Per-process usage from one scan, stored as parallel arrays
+
+    Attributes:
+        cpu (array): CPU usage since the previous scan in percent of one
+            core, 0.0 for processes first seen in this scan
+
+        cpu_measured (bool): False for the first scan, which has no
+            previous scan to measure CPU usage against
+
+        names (list): Command names as bytes
+
+        pids (array): Process IDs
+
+        ppids (array): Parent process IDs
+
+        rss (array): Resident set sizes in bytes
+
+        starts (array): Start times in clock ticks since boot
+
+        uids (array): Effective user ID of each process, empty unless the
+            scanner reads users
+
+        users (dict): Maps user ID to a [CPU usage, RSS, processes] list
+            summed over the processes of that user, empty unless the scanner
+            reads users
+    """
+
+    def __init__(self):
+        """Initialize an empty result"""
+
+        self.cpu = array('d')
+        self.cpu_measured = False
+        self.names = []
+        self.pids = array('i')
+        self.ppids = array('i')
+        self.rss = array('q')
+        self.starts = array('Q')
+        self.uids = array('I')
+        self.users = {}
+
+    def __len__(self):
+        """Number of processes scanned"""
+
+        return len(self.pids)
+
+    def top(self, k, values):
+        """Indices of the k processes with the largest values
+
+        Args:
+            k (int): Number of processes to return
+
+            values (array): One of cpu or rss
+
+        Returns:
+            list: Indices into this result, largest value first, selected
+                with a heap of at most k entries
+        """
+
+        return heapq.nlargest(k, range(len(values)), key=values.__getitem__)
+
+    def describe(self, index, values, unit):
+        """Human-readable summary of one process
+
+        Args:
+            index (int): Index into this result
+
+            values (array): One of cpu or rss
+
+            unit (str): '%' for cpu, 'MiB' for rss
+
+        Returns:
+            str: e.g. 'make (1234): 97.0%'
+        """
+
+        return '{0} ({1}): {2}'.format(
+                self.names[index].decode('utf-8', 'replace'),
+                str(self.pids[index]), format_usage(values[index], unit))
+
+
+class CpuAccounting:
+    """CPU time of every live process across scans in compact arrays
+
+    Each process owns a slot in parallel arrays of start time and CPU time,
+    found through a PID-to-slot index. A PID whose start time changed
+    belongs to a new process, so PID reuse never yields a bogus delta.
+    Slots of exited processes are recycled.
+
+    Attributes:
+        index (dict): Maps PID to slot
+
+        starts (array): Start time of the process in each slot, in clock
+            ticks since boot
+
+        ticks (array): CPU time (user + system) of the process in each slot
+            as of the last scan, in clock ticks
+    """
+
+    def __init__(self):
+        """Initialize an empty table"""
+
+        self.free = array('i')  # Slots of exited processes
+        self.index = {}
+        self.starts = array('Q')
+        self.ticks = array('Q')
+
+    def __len__(self):
+        """Number of processes tracked"""
+
+        return len(self.index)
+
+    def update(self, pid, start, ticks):
+        """Record the CPU time of a process
+
+        Args:
+            pid (int): Process ID
+
+            start (int): Start time of the process in clock ticks since boot
+
+            ticks (int): CPU time of the process in clock ticks
+
+        Returns:
+            int: CPU time consumed since the last update, None if the
+                process is new to the table
+        """
+
+        slot = self.index.get(pid)
+        if slot is not None and self.starts[slot] == start:
+            delta = ticks - self.ticks[slot]
+            self.ticks[slot] = ticks
+            return delta
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = len(self.starts)
+                self.starts.append(0)
+                self.ticks.append(0)
+            self.index[pid] = slot
+        self.starts[slot] = start  # New process or PID reused
+        self.ticks[slot] = ticks
+        return None
+
+    def prune(self, exited):
+        """Free the slots of processes that exited
+
+        Args:
+            exited (iterable): PIDs that exited
+        """
+
+        for pid in exited:
+            slot = self.index.pop(pid, None)
+            if slot is not None:
+                self.free.append(slot)
+
+    def retain(self, live):
+        """Free the slots of every process not in live
+
+        Catches processes that started and exited between two PID
+        comparisons and were therefore never reported as exited.
+
+        Args:
+            live (set): PIDs of every live process
+        """
+
+        self.prune([pid for pid in self.index if pid not in live])
+
+
+class ProcessScanner:
+    """Reads /proc/<pid>/stat of every user-space process once per scan
+
+    Usage is summed per user in the same pass, reading /proc/<pid>/status
+    for the effective UID when users is set. CPU usage of each process is
+    the CPU time it consumed since the previous scan divided by the time
+    elapsed, so no process is sampled twice and nothing sleeps. Processes
+    that exited must be passed to prune, the scanner only sweeps its table
+    itself when it has grown well past the number of live processes.
+
+    PID directories are read in batches. With more than one worker the
+    batches are read by a thread pool, which runs in parallel since file
+    reads release the GIL, while parsing and merging into the result stay
+    on the calling thread.
+
+    Attributes:
+        accounting (CpuAccounting): CPU time of every process as of the
+            previous scan
+
+        clock_ticks (int): Kernel clock ticks per second
+
+        last_scan (float): Monotonic time of the previous scan
+
+        page_size (int): Size of a memory page in bytes
+
+        proc_root (str): Mount point of procfs
+
+        users (bool): True to read the effective UID of every process from
+            /proc/<pid>/status and sum usage per user
+
+        workers (int): Number of threads reading PID directories, 1 reads
+            them on the calling thread
+    """
+
+    def __init__(self, proc_root=None, workers=1, users=True):
+        """Initialize scanner, the first scan reports no CPU usage
+
+        The thread pool is started by the first scan so that it survives
+        daemon-ization.
+
+        Args:
+            proc_root (str): Mount point of procfs, defaults to
+                procfs.PROC_ROOT
+
+            workers (int): Number of threads reading PID directories
+
+            users (bool): True to read the effective UID of every process
+                and sum usage per user
+        """
+
+        self.accounting = CpuAccounting()
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.last_scan = None
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.pool = None
+        self.proc_root = procfs.PROC_ROOT if proc_root is None else proc_root
+        self.users = users
+        self.workers = max(int(workers), 1)
+
+    def close(self):
+        """Stop the thread pool if it was started"""
+
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def read(self, names):
+        """Read /proc/<pid>/stat of a batch of processes
+
+        Args:
+            names (list): PID directory names
+
+        Returns:
+            list: (PID, effective UID, stat contents) tuples of processes
+                that still exist, UID None unless reading users
+        """
+
+        records = []
+        proc_root = self.proc_root
+        users = self.users
+        for name in names:
+            try:
+                fd = os.open(os.path.join(proc_root, name, 'stat'),
+                             os.O_RDONLY)
+            except (IOError, OSError):  # Process exited
+                continue
+            try:
+                data = os.read(fd, 4096)
+            except (IOError, OSError):
+                continue
+            finally:
+                os.close(fd)
+            uid = None
+            if users:
+                # Not the owner of /proc/<pid>/stat, which is root for
+                # non-dumpable processes such as setuid programs
+                uid = self.read_uid(name)
+                if uid is None:
+                    continue
+            records.append((int(name), uid, data))
+        return records
+
+    def read_uid(self, name):
+        """Effective UID from the Uid line of /proc/<pid>/status
+
+        Args:
+            name (str): PID directory name
+
+        Returns:
+            int: Effective UID, None if the process exited
+        """
+
+        try:
+            fd = os.open(os.path.join(self.proc_root, name, 'status'),
+                         os.O_RDONLY)
+        except (IOError, OSError):  # Process exited
+            return None
+        try:
+            data = os.read(fd, 4096)
+        except (IOError, OSError):
+            return None
+        finally:
+            os.close(fd)
+        start = data.find(b'\nUid:')
+        if start < 0:
+            return None
+        return int(data[start + 5:data.find(b'\n', start + 5)].split()[1])
+
+    def scan(self, now, pids=None):
+        """Read usage of every user-space process
+
+        Args:
+            now (float): Current monotonic time in seconds
+
+            pids (iterable): PIDs of the user-space processes to read, e.g.
+                those the daemon already listed and filtered this check,
+                defaults to listing proc_root
+
+        Returns:
+            ScanResult: Usage of every process, kernel threads excluded
+        """
+
+        result = ScanResult()
+        result.cpu_measured = self.last_scan is not None
+        users = result.users
+        elapsed = None if self.last_scan is None else now - self.last_scan
+        scale = 100.0 / (elapsed * self.clock_ticks) if elapsed else 0.0
+        accounting = self.accounting
+        if pids is None:
+            names = [entry.name for entry in os.scandir(self.proc_root)
+                     if entry.name.isdigit()]
+        else:
+            names = [str(pid) for pid in pids]
+        batches = [names[i:i + BATCH_SIZE] for i in
+                   range(0, len(names), BATCH_SIZE)]
+        if self.workers > 1 and len(batches) > 1:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(self.workers)
+            records = self.pool.map(self.read, batches)
+        else:
+            records = map(self.read, batches)
+        for pid, uid, data in (record for batch in records
+                               for record in batch):
+            name_end = data.rfind(b')')
+            fields = data[name_end + 2:].split()
+            if int(fields[procfs.STAT_FLAGS]) & procfs.PF_KTHREAD:
+                continue
+            start = int(fields[procfs.STAT_STARTTIME])
+            ticks = int(fields[procfs.STAT_UTIME]) + \
+                int(fields[procfs.STAT_STIME])
+            delta = accounting.update(pid, start, ticks)
+            cpu = 0.0 if delta is None else delta * scale
+            rss = int(fields[procfs.STAT_RSS]) * self.page_size
+            result.pids.append(pid)
+            result.ppids.append(int(fields[procfs.STAT_PPID]))
+            result.starts.append(start)
+            result.names.append(data[data.find(b'(') + 1:name_end])
+            result.cpu.append(cpu)
+            result.rss.append(rss)
+            if uid is None:
+                continue
+            result.uids.append(uid)
+            totals = users.get(uid)
+            if totals is None:
+                users[uid] = [cpu, rss, 1]
+            else:
+                totals[0] += cpu
+                totals[1] += rss
+                totals[2] += 1
+        if len(accounting) > 2 * len(result) + 64:  # Missed exits
+            accounting.retain(set(result.pids))
+        self.last_scan = now
+        return result
+
+    def prune(self, exited):
+        """Forget processes that exited
+
+        Args:
+            exited (iterable): PIDs that exited since the last prune
+        """
+
+        self.accounting.prune(exited)
@@ -0,0 +1,290 @@
+#! /usr/bin/env python
+
+"""Process tree and systemd unit rollups of per-process usage
+
+Copyright:
+
+    proctree.py roll up per-process resource usage by tree and unit
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import heapq
+import os
+from resource_alerter import procfs
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Share of a subtree's usage a single child must carry for the subtree to be
+# reported as that child's subtree instead
+COLLAPSE_SHARE = 0.9
+
+# PIDs whose subtrees are the whole host, only their children are reported
+HOST_ROOTS = (1, 2)
+
+# Suffixes of systemd unit names, checked from the end of a cgroup path
+UNIT_SUFFIXES = (b'.service', b'.scope')
+
+
+def parse_unit(data):
+    """Name of the systemd unit a process belongs to
+
+    Args:
+        data (bytes): Contents of /proc/<pid>/cgroup
+
+    Returns:
+        str: Innermost service or scope of the systemd hierarchy, else the
+            innermost cgroup, '/' for the root cgroup
+    """
+
+    path = None
+    for line in data.splitlines():
+        hierarchy, controllers, cgroup = line.split(b':', 2)
+        if controllers == b'name=systemd':  # cgroup v1 or hybrid
+            path = cgroup
+            break
+        elif hierarchy == b'0':  # cgroup v2
+            path = cgroup
+    if not path or path == b'/':
+        return '/'
+    components = path.strip(b'/').split(b'/')
+    for component in reversed(components):
+        if component.endswith(UNIT_SUFFIXES):
+            return component.decode('utf-8', 'replace')
+    return components[-1].decode('utf-8', 'replace')
+
+
+class ProcessTree:
+    """Parent to children index of user-space processes kept across scans
+
+    The index is only modified for processes that spawned, exited or were
+    reparented since the previous scan, and the systemd unit of a process is
+    read from /proc/<pid>/cgroup once in its lifetime. Rollups sum a
+    per-process value of a ScanResult over subtrees or units.
+
+    Attributes:
+        children (dict): Maps PID to the set of PIDs of its children
+
+        parents (dict): Maps PID to parent PID
+
+        proc_root (str): Mount point of procfs
+
+        starts (dict): Maps PID to start time, a different start time means
+            the PID was reused
+
+        units (dict): Maps PID to the name of its systemd unit
+    """
+
+    def __init__(self, proc_root=None):
+        """Initialize an empty index
+
+        Args:
+            proc_root (str): Mount point of procfs, defaults to
+                procfs.PROC_ROOT
+        """
+
+        self.children = {}
+        self.parents = {}
+        self.proc_root = procfs.PROC_ROOT if proc_root is None else proc_root
+        self.starts = {}
+        self.units = {}
+
+    def __len__(self):
+        """Number of processes indexed"""
+
+        return len(self.starts)
+
+    def read_unit(self, pid):
+        """Read the systemd unit of a process
+
+        Args:
+            pid (int): Process ID
+
+        Returns:
+            str: Unit name as returned by parse_unit, None if the process
+                exited
+        """
+
+        try:
+            with open(os.path.join(self.proc_root, str(pid), 'cgroup'),
+                      'rb') as cgroup:
+                return parse_unit(cgroup.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _detach(self, pid):
+        """Remove a process from the children of its recorded parent"""
+
+        parent = self.parents.pop(pid, None)
+        siblings = self.children.get(parent)
+        if siblings is not None:
+            siblings.discard(pid)
+            if not siblings:
+                del self.children[parent]
+
+    def prune(self, exited):
+        """Remove processes that exited
+
+        Children of an exited process stay indexed under it until a scan
+        shows their new parent.
+
+        Args:
+            exited (iterable): PIDs that exited
+        """
+
+        for pid in exited:
+            if self.starts.pop(pid, None) is not None:
+                self._detach(pid)
+                self.units.pop(pid, None)
+
+    def update(self, result):
+        """Apply spawns, PID reuse and reparenting seen in a scan
+
+        Args:
+            result (ScanResult): Scan including parent PIDs and start times
+        """
+
+        parents = self.parents
+        starts = self.starts
+        for pid, ppid, start in zip(result.pids, result.ppids,
+                                    result.starts):
+            if starts.get(pid) != start:  # Spawned, or PID reused
+                self._detach(pid)
+                starts[pid] = start
+                self.units[pid] = self.read_unit(pid)
+            if parents.get(pid) != ppid:
+                self._detach(pid)
+                parents[pid] = ppid
+                self.children.setdefault(ppid, set()).add(pid)
+        if len(starts) > 2 * len(result) + 64:  # Missed exits
+            live = set(result.pids)
+            self.prune([pid for pid in starts if pid not in live])
+
+    def rollup(self, result, values):
+        """Sum a per-process value over the subtree of every process
+
+        Args:
+            result (ScanResult): Scan the index was last updated with
+
+            values (array): One of result.cpu or result.rss
+
+        Returns:
+            dict: Maps PID to a [total, processes] list for its subtree,
+                itself included
+        """
+
+        own = dict(zip(result.pids, values))
+        totals = {}
+        for root in own:
+            if self.parents.get(root) in own:
+                continue
+            stack = [root]
+            visited = set()
+            while stack:  # Iterative post-order walk, trees may be deep
+                pid = stack[-1]
+                if pid not in visited:
+                    visited.add(pid)
+                    stack.extend(child for child in
+                                 self.children.get(pid, ())
+                                 if child in own and child not in visited)
+                    continue
+                stack.pop()
+                if pid in totals:
+                    continue
+                total = [own[pid], 1]
+                for child in self.children.get(pid, ()):
+                    subtotal = totals.get(child)
+                    if subtotal is not None:
+                        total[0] += subtotal[0]
+                        total[1] += subtotal[1]
+                totals[pid] = total
+        return totals
+
+    def heaviest(self, result, values, k):
+        """Subtrees using the most of a resource
+
+        The children of init are the candidates. A candidate whose usage is
+        almost all in one child's subtree is replaced by that child's
+        subtree, repeatedly, so a chain such as sshd, bash, make is reported
+        as make.
+
+        Args:
+            result (ScanResult): Scan the index was last updated with
+
+            values (array): One of result.cpu or result.rss
+
+            k (int): Number of subtrees to return
+
+        Returns:
+            list: (PID, total, processes) tuples of the k heaviest subtrees,
+                heaviest first
+        """
+
+        totals = self.rollup(result, values)
+        candidates = [pid for pid in totals if pid not in HOST_ROOTS and
+                      (self.parents.get(pid) in HOST_ROOTS or
+                       self.parents.get(pid) not in totals)]
+        heaviest = []
+        for pid in candidates:
+            total = totals[pid][0]
+            while total > 0:
+                heavy = None
+                for child in self.children.get(pid, ()):
+                    subtotal = totals.get(child)
+                    if subtotal is not None and \
+                            subtotal[0] >= COLLAPSE_SHARE * total:
+                        heavy = child
+                        break
+                if heavy is None:
+                    break
+                pid = heavy
+                total = totals[pid][0]
+            heaviest.append((pid, total, totals[pid][1]))
+        return heapq.nlargest(k, heaviest, key=lambda tree: tree[1])
+
+    def by_unit(self, result, values, k):
+        """systemd units using the most of a resource
+
+        Args:
+            result (ScanResult): Scan the index was last updated with
+
+            values (array): One of result.cpu or result.rss
+
+            k (int): Number of units to return
+
+        Returns:
+            list: (unit, total, processes) tuples of the k heaviest units,
+                heaviest first
+        """
+
+        units = {}
+        for pid, value in zip(result.pids, values):
+            unit = self.units.get(pid)
+            if unit is None:
+                continue
+            total = units.get(unit)
+            if total is None:
+                units[unit] = [value, 1]
+            else:
+                total[0] += value
+                total[1] += 1
+        return heapq.nlargest(k, ((unit, total[0], total[1]) for unit, total
+                                  in units.items()),
+                              key=lambda unit: unit[1])
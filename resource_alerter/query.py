@@ -0,0 +1,325 @@
+#! /usr/bin/env python
+
+"""Answers queries about recent usage over a Unix socket
+
+Requests and responses are JSON objects, one per line. Requests are:
+
+    {"query": "current"}
+    {"query": "range", "metric": "ram", "seconds": 600}
+    {"query": "aggregate", "metric": "ram", "seconds": 600}
+
+where seconds is optional and defaults to every sample kept. Responses
+carry "ok": true and the answer, or "ok": false and an "error".
+
+Copyright:
+
+    query.py answer queries about resource_alerterd samples
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import json
+import os
+import selectors
+import socket
+import stat
+import threading
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Longest request line accepted, longer requests close the connection
+MAX_REQUEST = 4096
+
+# Unsent response bytes per client above which its requests are no longer
+# read, so a client that never reads its responses cannot grow memory
+MAX_RESPONSE = 1048576
+
+QUERIES = ('current', 'range', 'aggregate')
+
+
+def aggregate(values):
+    """Minimum, maximum, mean and 95th percentile of samples
+
+    The percentile is nearest-rank, as SampleRing computes it.
+
+    Args:
+        values (list): Sample values
+
+    Returns:
+        dict: Count and statistics, statistics None if values is empty
+    """
+
+    if not values:
+        return {'count': 0, 'min': None, 'max': None, 'avg': None,
+                'p95': None}
+    ordered = sorted(values)
+    rank = int(-(-95.0 * len(ordered) // 100.0))  # Ceiling division
+    return {'count': len(ordered), 'min': ordered[0], 'max': ordered[-1],
+            'avg': round(sum(ordered) / len(ordered), 3),
+            'p95': ordered[min(max(rank, 1), len(ordered)) - 1]}
+
+
+class QueryServer:
+    """Answers queries from the samples published after each check
+
+    The daemon publishes copies of its sample windows once per resource
+    check and a selector loop on a background thread answers every query
+    from the latest copy, so queries never read /proc, never wait on a
+    resource check and never see a window half updated. Many clients are
+    served at once and each may send any number of requests. A client is
+    not read from while MAX_RESPONSE bytes of responses to it are unsent.
+
+    Attributes:
+        mode (int): Permissions of the socket
+
+        path (str): Path of the Unix socket
+
+        socket (socket): Listening socket, None until opened
+
+        state (dict): Last published state, None before the first check
+    """
+
+    def __init__(self, path, mode=0o666):
+        """Describe the socket, open binds it and start serves it
+
+        Args:
+            path (str): Path of the Unix socket
+
+            mode (int): Permissions of the socket, set explicitly since the
+                daemon runs with a umask of 0
+        """
+
+        self.mode = mode
+        self.path = path
+        self.selector = None
+        self.socket = None
+        self.state = None
+        self.thread = None
+        self.wakeup = None  # Pipe interrupting the selector on close
+
+    def open(self):
+        """Bind the listening socket, replacing a stale socket"""
+
+        try:
+            if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                os.remove(self.path)
+        except OSError:  # No stale socket
+            pass
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(self.path)
+        os.chmod(self.path, self.mode)
+        self.socket.listen(16)
+        self.socket.setblocking(False)
+        self.wakeup = os.pipe()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.selector.register(self.wakeup[0], selectors.EVENT_READ)
+
+    def close(self):
+        """Stop serving and close the listening socket"""
+
+        if self.socket is None:
+            return
+        os.write(self.wakeup[1], b'\0')
+        if self.thread is not None:
+            self.thread.join()
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj not in (self.socket, self.wakeup[0]):
+                key.fileobj.close()
+        self.selector.close()
+        self.socket.close()
+        self.socket = None
+        os.close(self.wakeup[0])
+        os.close(self.wakeup[1])
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def publish(self, tick_time, rings, levels, alerts):
+        """Answer queries from the samples of this resource check on
+
+        Args:
+            tick_time (float): Start of the check in seconds since Epoch
+
+            rings (dict): Maps metric names to their SampleRing
+
+            levels (dict): Maps metric names to the alert level their last
+                sample reached
+
+            alerts (dict): Maps kinds of alert to the number active
+        """
+
+        metrics = {}
+        for metric, ring in rings.items():
+            times, values = ring.window()
+            metrics[metric] = {'ewma': ring.ewma, 'level': levels[metric],
+                               'times': times.tolist(),
+                               'values': values.tolist()}
+        self.state = {'alerts': dict(alerts), 'metrics': metrics,
+                      'time': tick_time}
+
+    def answer(self, request):
+        """Answer one request
+
+        Args:
+            request (bytes): JSON request, without the newline
+
+        Returns:
+            dict: Response
+        """
+
+        try:
+            request = json.loads(request.decode('utf-8'))
+        except ValueError:
+            return {'ok': False, 'error': 'Request is not JSON'}
+        if not isinstance(request, dict) or \
+                request.get('query') not in QUERIES:
+            return {'ok': False, 'error': 'query must be one of {0}'.format(
+                    ', '.join(QUERIES))}
+        state = self.state  # One check's state for the whole answer
+        if state is None:
+            return {'ok': False, 'error': 'No resource check completed yet'}
+        if request['query'] == 'current':
+            current = {'ok': True, 'time': state['time'],
+                       'alerts': state['alerts']}
+            for metric, window in state['metrics'].items():
+                current[metric] = {
+                        'value': window['values'][-1] if window['values']
+                        else None,
+                        'time': window['times'][-1] if window['times']
+                        else None,
+                        'ewma': window['ewma'], 'level': window['level']}
+            return current
+
+        metric = request.get('metric')
+        window = state['metrics'].get(metric) if isinstance(metric, str) \
+            else None
+        if window is None:
+            return {'ok': False, 'error': 'metric must be one of {0}'.format(
+                    ', '.join(sorted(state['metrics'])))}
+        seconds = request.get('seconds')
+        first = 0
+        if seconds is not None:
+            try:
+                start = time.time() - float(seconds)
+            except (TypeError, ValueError):
+                return {'ok': False, 'error': 'seconds must be a number'}
+            first = bisect.bisect_left(window['times'], start)
+        times = window['times'][first:]
+        values = window['values'][first:]
+        if request['query'] == 'range':
+            return {'ok': True, 'metric': request['metric'], 'times': times,
+                    'values': values}
+        answer = aggregate(values)
+        answer.update({'ok': True, 'metric': request['metric'],
+                       'start': times[0] if times else None,
+                       'end': times[-1] if times else None})
+        return answer
+
+    def start(self):
+        """Start the thread answering requests"""
+
+        self.thread = threading.Thread(target=self.serve, name='query')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        """Answer requests until closed"""
+
+        while True:
+            for key, events in self.selector.select():
+                if key.fileobj is self.socket:
+                    self.accept()
+                elif key.fileobj == self.wakeup[0]:
+                    return
+                else:
+                    self.service(key, events)
+
+    def accept(self):
+        """Accept a client"""
+
+        try:
+            connection, _ = self.socket.accept()
+        except OSError:  # The client gave up
+            return
+        connection.setblocking(False)
+        self.selector.register(connection, selectors.EVENT_READ,
+                               [bytearray(), bytearray()])  # Input, output
+
+    def service(self, key, events):
+        """Read requests from and write responses to a client
+
+        Args:
+            key (SelectorKey): Registration of the client
+
+            events (int): Ready events
+        """
+
+        connection = key.fileobj
+        incoming, outgoing = key.data
+        try:
+            if events & selectors.EVENT_READ:
+                data = connection.recv(65536)
+                if not data:
+                    raise EOFError
+                incoming += data
+            self.respond(incoming, outgoing)
+            if outgoing:
+                sent = connection.send(outgoing)
+                del outgoing[:sent]
+                self.respond(incoming, outgoing)  # Requests held back
+        except (BlockingIOError, InterruptedError):
+            pass
+        except (EOFError, OSError):
+            self.selector.unregister(connection)
+            connection.close()
+            return
+        self.selector.modify(connection,
+                             (selectors.EVENT_READ if len(outgoing) <
+                              MAX_RESPONSE else 0) |
+                             (selectors.EVENT_WRITE if outgoing else 0),
+                             key.data)
+
+    def respond(self, incoming, outgoing):
+        """Answer complete requests until MAX_RESPONSE bytes are unsent
+
+        Args:
+            incoming (bytearray): Bytes received, answered requests are
+                removed
+
+            outgoing (bytearray): Bytes to send, responses are appended
+
+        Raises:
+            EOFError: If a request is longer than MAX_REQUEST
+        """
+
+        while len(outgoing) < MAX_RESPONSE:
+            end = incoming.find(b'\n')
+            if end < 0:
+                if len(incoming) > MAX_REQUEST:
+                    raise EOFError
+                return
+            outgoing += json.dumps(self.answer(bytes(incoming[:end])),
+                                   separators=(',', ':')).encode()
+            outgoing += b'\n'
+            del incoming[:end + 1]
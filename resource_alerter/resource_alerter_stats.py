@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+
+"""Prints the last resource check published by resource_alerterd
+
+Usage:
+
+    resource_alerter_stats.py [--json] [file]
+
+Synopsis:
+
+    Reads the live stats file written by resource_alerterd after every
+    resource check and prints CPU and RAM usage with their alert levels on
+    one line, or every field as JSON with --json. Only the standard library
+    is imported, so this is cheap enough to run from shell prompts and login
+    scripts. file defaults to /var/run/resource_alerterd/live_stats. Exits
+    non-zero if the file cannot be read or holds no check yet.
+
+Copyright:
+
+    resource_alerter_stats.py print live resource_alerterd stats
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+from resource_alerter import livestats
+import sys
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+DEFAULT_PATH = '/var/run/resource_alerterd/live_stats'
+
+
+def daemon_running(pid):
+    """Determine whether the process that published the stats still runs
+
+    Args:
+        pid (int): PID of the daemon
+
+    Returns:
+        bool: False if no process has that PID, else True
+    """
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Exists, owned by another user
+        pass
+    return True
+
+
+def summary(stats):
+    """One line describing the stats
+
+    Args:
+        stats (dict): Stats as returned by livestats.read
+
+    Returns:
+        str: Usage and alert level per metric and age of the check
+    """
+
+    parts = []
+    for metric in ('cpu', 'ram'):
+        usage = stats[metric + '_percent']
+        part = '{0} {1}'.format(metric.upper(), 'n/a' if usage is None
+                                else '{0:.1f}%'.format(usage))
+        if stats[metric + '_level'] is not None:
+            part += ' ' + stats[metric + '_level']
+        parts.append(part)
+    age = '{0:.0f} sec ago'.format(max(time.time() - stats['time'], 0.0))
+    if not daemon_running(stats['pid']):
+        age += ', resource_alerterd not running'
+    return '{0} ({1})'.format(', '.join(parts), age)
+
+
+if __name__ == '__main__':
+
+    arguments = sys.argv[1:]
+    as_json = '--json' in arguments
+    if as_json:
+        arguments.remove('--json')
+    path = arguments[0] if arguments else DEFAULT_PATH
+    try:
+        stats = livestats.read(path)
+    except (IOError, OSError, ValueError) as error:
+        sys.exit('Cannot read {0}: {1}'.format(path, str(error)))
+    if stats is None:
+        sys.exit('No resource check published in {0} yet'.format(path))
+    if as_json:
+        import json
+        print(json.dumps(stats, sort_keys=True))
+    else:
+        print(summary(stats))
@@ -45,17 +45,35 @@ Copyright:
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import difflib
 import logging
 import logging.config
 import os
-from pkg_resources import resource_stream
 import psutil
+import pwd
 from ra_daemon import runner
-import subprocess
+from resource_alerter import config as config_loader
+from resource_alerter.cgroups import CgroupMonitor
+from resource_alerter.cores import CoreMonitor
+from resource_alerter.fleet import FleetAggregator, FleetSender
+from resource_alerter.history import HistoryStore, METRICS
+from resource_alerter.livestats import LiveStats, LEVELS
+from resource_alerter.logqueue import BatchingLogListener
+from resource_alerter.metrics import MetricsPage, MetricsServer
+from resource_alerter.notify import AlertDispatcher, TtyBroadcaster
+from resource_alerter.pidset import PidSet
+from resource_alerter.pressure import PressureMonitor
+from resource_alerter import procfs
+from resource_alerter.procfs import KernelThreadClassifier
+from resource_alerter.procscan import format_usage, ProcessScanner
+from resource_alerter.proctree import ProcessTree
+from resource_alerter.query import QueryServer
+from resource_alerter.samplers import make_sampler
+from resource_alerter.scheduler import DeadlineScheduler
+from resource_alerter.selfstats import SelfStats, untimed
+from resource_alerter.stats import SampleRing, STATISTICS
+import signal
 import sys
 import time
-import yaml
 
 __author__ = 'Alex Hyer'
 __email__ = 'theonehyer@gmail.com'
@@ -64,6 +82,13 @@ __maintainer__ = 'Alex Hyer'
 __status__ = 'Production'
 __version__ = '1.0.0'
 
+# Configured from resource_alerterd.logging.conf when run as a script
+debug_logger = logging.getLogger('debug_logger')
+info_logger = logging.getLogger('info_logger')
+warning_logger = logging.getLogger('warning_logger')
+error_logger = logging.getLogger('error_logger')
+critical_logger = logging.getLogger('critical_logger')
+
 
 class ResourceAlerter:
     """Daemon-ized, checks various resource usage and alerts users
@@ -76,8 +101,35 @@ class ResourceAlerter:
     resource_alerterd is configured to use wall as per resource_alerterd.conf.
 
     Attributes:
+        cgroup_alerts (dict): Maps (cgroup, resource) pairs to the level of
+            the alert raised for the current episode of high usage
+
+        cgroup_monitor (CgroupMonitor): Samples cgroups relative to their
+            limits, None if cgroup_check is False
+
+        checks (dict): Maps names of scheduled resource checks to the
+            methods performing them
+
         config (dict): Program configuration options
 
+        core_alert (bool): True while enough cores have been hot for long
+            enough to have raised a core usage warning
+
+        core_monitor (CoreMonitor): Tracks per-core CPU usage, None if
+            core_check is False
+
+        dispatcher (AlertDispatcher): Merges and broadcasts high usage
+            alerts from a background thread
+
+        fleet (FleetSender): Pushes samples and alerts to the fleet
+            aggregator, None if fleet_aggregator is not set
+
+        history (HistoryStore): On-disk history of samples, None if
+            disabled
+
+        kernel_threads (KernelThreadClassifier): Cache of which PIDs belong
+            to kernel threads
+
         last_cpu_check (float): Seconds since CPU usage last checked
 
         last_cpu_override (float): Seconds since last CPU override check
@@ -86,6 +138,15 @@ class ResourceAlerter:
 
         last_ram_override (float): Seconds since last RAM override check
 
+        metrics (MetricsServer): Serves metrics of the last resource check
+            in Prometheus text format, None if metrics_listen is not set
+
+        live_stats (LiveStats): Memory-mapped file holding the last resource
+            check for local readers, None if live_stats_file is not set
+
+        log_listener (BatchingLogListener): Writes logs from a background
+            thread, None if logs are written synchronously
+
         pidfile_path (str): File path to PID file
 
         pidfile_timeout (int): Max time between successful acces to PID file
@@ -94,41 +155,135 @@ class ResourceAlerter:
         pids_same (bool): True if PIDs of current resource usage check are
         highly similar to the last resource check as defined in in config
 
-        old_pid_list (list): List of non-kernal PIDs from last resource usage
+        process_scanner (ProcessScanner): Reads per-process usage every
+            resource check, None if top_processes and top_trees are 0 and
+            user_check is False
+
+        process_tree (ProcessTree): Parent to children index of processes
+            for rolling usage up by subtree and systemd unit, None if
+            top_trees is 0
+
+        process_usage (ScanResult): Per-process usage from the last scan
+
+        pressure (PressureMonitor): PSI triggers waking the daemon on CPU
+            or RAM pressure, None if PSI wakeups are disabled or unavailable
+
+        query (QueryServer): Answers queries about recent samples over a
+            Unix socket, None if query_socket is not set
+
+        pid_set (PidSet): Sorted non-kernel PIDs from last resource usage
+            check along with PIDs spawned and exited since the check before
+
+        samples (dict): Maps 'cpu' and 'ram' to a SampleRing of their last
+            sample_history usage samples
+
+        sampler (PsutilSampler or ProcSampler): Backend reading CPU and RAM
+            usage as configured in resource_alerterd.conf
+
+        scheduler (DeadlineScheduler): Deadlines of every scheduled resource
             check
 
+        self_stats (SelfStats): Timings of each phase of resource checks and
+            usage of the daemon itself, None if self_stats is False
+
+        self_stats_path (str): File path the self_stats snapshot is written
+            to on SIGUSR1
+
         stable_cpu_ref (float): CPU usage of last high CPU usage broadcast
 
         stable_ram_ref (float): RAM usage of last high RAM usage broadcast
 
-        start_time (float): Start of current resource check in seconds since
-            Epoch (beginning of time)
+        start_time (float): Start of current resource check in seconds on
+            the monotonic clock, unaffected by changes to system time
 
         stdin_path (str): File path for STDIN
 
         stdierr_path (str): File path for STDERR
 
         stdout_path (str): File path for STDOUT
+
+        user_alerts (set): (user ID, resource) pairs whose share of the host
+            has been above user_share_level since last warned about
     """
 
     def __init__(self, config):
         """Initializes many essential daemon-wide run-time variables"""
 
+        self.cgroup_alerts = {}
+        self.cgroup_monitor = None
+        if config['cgroup_check']:
+            self.cgroup_monitor = CgroupMonitor(config['cgroup_root'])
+        self.checks = {}
         self.config = config  # Dictionary from YAML configuration file
+        self.core_alert = False
+        self.core_monitor = None
+        if config['core_check']:
+            self.core_monitor = CoreMonitor(config['core_hot_level'],
+                                            config['core_hot_duration'])
+        self.dispatcher = AlertDispatcher(
+                queue_size=config['wall_queue_size'],
+                rate_limits={'Critical': config['critical_wall_rate_limit'],
+                             'Warning': config['warning_wall_rate_limit']})
+        self.fleet = None
+        if config['fleet_aggregator']:
+            self.fleet = FleetSender(config['fleet_aggregator'],
+                                     config['fleet_host_id'])
+        self.history = None
+        if config['history_file']:
+            self.history = HistoryStore(config['history_file'],
+                                        config['history_records'])
+        self.kernel_threads = KernelThreadClassifier(config['proc_root'])
         self.last_cpu_check = None
         self.last_cpu_override = None
         self.last_ram_check = None
         self.last_ram_override = None
+        self.live_stats = None
+        if config['live_stats_file']:
+            self.live_stats = LiveStats(config['live_stats_file'])
+        self.log_listener = None
+        self.metrics = None
+        if config['metrics_listen']:
+            self.metrics = MetricsServer(config['metrics_listen'])
         self.pidfile_path = '/var/run/resource_alerterd/resource_alerterd.pid'
         self.pidfile_timeout = 5
         self.pids_same = False
-        self.old_pid_list = []
+        self.pid_set = PidSet()
+        self.pressure = None
+        self.process_scanner = None
+        if config['top_processes'] or config['top_trees'] or \
+                config['user_check']:
+            self.process_scanner = ProcessScanner(
+                    config['proc_root'], workers=config['scan_workers'],
+                    users=config['user_check'])
+        self.process_tree = None
+        if config['top_trees']:
+            self.process_tree = ProcessTree(config['proc_root'])
+        self.process_usage = None
+        self.query = None
+        if config['query_socket']:
+            self.query = QueryServer(config['query_socket'])
+        self.sampler = make_sampler(config['sampler'], config['proc_root'])
+        if config['alert_statistic'] not in STATISTICS:
+            raise ValueError('Unknown alert_statistic "{0}": must be one of '
+                             '{1}'.format(config['alert_statistic'],
+                                          ', '.join(STATISTICS)))
+        self.samples = {
+            'cpu': SampleRing(config['sample_history'],
+                              alpha=config['ewma_alpha']),
+            'ram': SampleRing(config['sample_history'],
+                              alpha=config['ewma_alpha'])}
+        self.scheduler = DeadlineScheduler()
+        self.self_stats = None
+        if config['self_stats']:
+            self.self_stats = SelfStats(config['self_stats_samples'])
+        self.self_stats_path = '/var/run/resource_alerterd/self_stats.json'
         self.stable_cpu_ref = None
         self.stable_ram_ref = None
         self.start_time = None
         self.stdin_path = '/dev/null'  # No STDIN
         self.stderr_path = '/dev/null'  # No STDERR
         self.stdout_path = '/dev/null'  # No STDOUT
+        self.user_alerts = set()
         self.wall_critical = False  # Broadcast critical resource use
         self.wall_warning = False  # Broadcast high resource use
 
@@ -158,10 +313,12 @@ class ResourceAlerter:
         else:
             return True
 
-    @staticmethod
-    def non_kernel_pids(pids_list):
+    def non_kernel_pids(self, pids_list):
         """Filter out kernel processes from a list of process IDs
 
+        Only PIDs not seen in the previous check are read from /proc, all
+        others reuse their cached classification.
+
         Args:
             pids_list (list): List of PIDs
 
@@ -170,20 +327,15 @@ class ResourceAlerter:
         """
 
         info_logger.info('Filtering out kernel PIDs')
-        non_kernel_pids = []
-        for pid in pids_list:
-            pid_exe_path = '/proc/{0}/exe'.format(str(pid))
-            try:
-                assert bool(os.readlink(pid_exe_path)) is True  # Link exists
-                non_kernel_pids.append(pid)  # Link exists = non-kernel pid
-            except (OSError, AssertionError):  # Link doesn't exist
-                pass  # Link doesn't exist = kernel pid = do not add to list
+        non_kernel_pids = self.kernel_threads.non_kernel_pids(pids_list)
         info_logger.info('Finished filtering kernel PIDs')
         return non_kernel_pids
 
-    @staticmethod
-    def wall(resource=None, level=None, usage=None):
-        """Attempts to broadcast wall message and logs error if it cannot
+    def wall(self, resource=None, level=None, usage=None, detail=None):
+        """Queues high usage for broadcast via 'wall' at the end of the check
+
+        Broadcasts of all resources queued during one resource check are
+        merged and sent by the dispatcher's background thread.
 
         Args:
             resource (str): Resource to broadcast hig usage of
@@ -192,21 +344,15 @@ class ResourceAlerter:
                 'Warning,' 'Critical,' etc.
 
             usage (float): Current resource usage, converted to str
+
+            detail (str): Optional extra line, e.g. the top processes
         """
 
-        message = '{0} Usage {1}: {2}%\nIt is recommended that you do not ' \
-                  'start any {0} intensive processes at this ' \
-                  'time.'.format(resource, level, str(usage))
-        try:
-            info_logger.info('Attempting broadcast')
-            subprocess.call(['wall', message])
-            info_logger.info('Broadcast successful')
-        except OSError as error:
-            info_logger.info(
-                    'Broadcast unsuccessful: see error log for more info')
-            error_message = '{0}: Cannot send broadcast via the program ' \
-                            '"wall"'.format(error)
-            error_logger.error(error_message)
+        info_logger.info('Queueing broadcast')
+        summary = '{0} Usage {1}: {2}%'.format(resource, level, str(usage))
+        if detail is not None:
+            summary = '{0}\n{1}'.format(summary, detail)
+        self.dispatcher.submit(resource, level, summary)
 
     # This method is literally just the Python 3.5.1 which function from the
     # shutil library in order to permit this functionality in Python 2.
@@ -277,27 +423,144 @@ class ResourceAlerter:
     def check_wall(self):
         """See if daemon can/should broadcast high usage messages via 'wall'
 
-        Does not return anything; directly changes run-time variable of
-        wall_critical and wall_warning.
+        Broadcasting directly to user terminals is preferred over the
+        program 'wall' as it does not fork. Does not return anything;
+        directly changes run-time variable of wall_critical and wall_warning
+        and sets the dispatcher's broadcast method.
         """
 
-        if bool(self.which('wall')):
+        tty_broadcaster = TtyBroadcaster()
+        if tty_broadcaster.available():
+            debug_logger.debug('Login records found: broadcasting directly '
+                               'to terminals')
+            self.dispatcher.broadcast = tty_broadcaster.broadcast
+        elif bool(self.which('wall')):
             debug_logger.debug('Program "wall" found')
-            if self.config['critical_wall_message']:
-                self.wall_critical = True
-                debug_logger.debug('Critical broadcasts enabled')
-            else:
-                debug_logger.debug('Critical broadcasts disabled')
-            if self.config['warning_wall_message']:
-                self.wall_warning = True
-                debug_logger.debug('Warning broadcasts enabled')
-            else:
-                debug_logger.debug('Warning broadcasts disabled')
         else:
             debug_logger.debug('Program "wall" not found')
+            return
+
+        if self.config['critical_wall_message']:
+            self.wall_critical = True
+            debug_logger.debug('Critical broadcasts enabled')
+        else:
+            debug_logger.debug('Critical broadcasts disabled')
+        if self.config['warning_wall_message']:
+            self.wall_warning = True
+            debug_logger.debug('Warning broadcasts enabled')
+        else:
+            debug_logger.debug('Warning broadcasts disabled')
+
+    def core_check(self):
+        """Checks per-core CPU usage, logs and/or broadcasts hot cores
 
-    def cpu_check(self):
-        """Checks CPU usage, logs and/or broadcasts high usage"""
+        A few saturated cores running single-threaded bottlenecks barely
+        move the aggregate CPU usage on hosts with many cores, so this
+        warns when core_hot_count cores stay at or above core_hot_level
+        for core_hot_duration seconds. One warning is raised per episode.
+        """
+
+        info_logger.info('Determining per-core CPU usage')
+        busy, total = self.sampler.core_times()
+        summary = self.core_monitor.update(self.start_time, busy, total)
+        if summary is None:
+            info_logger.info('No per-core CPU usage baseline: skipping core '
+                             'usage check')
+            return
+        info_logger.info('Core Usage: {0} of {1} cores above {2}%, {3} for '
+                         'at least {4} sec, imbalance {5:.1f} percentage '
+                         'points'.format(str(summary.hot), str(summary.cores),
+                                         str(self.config['core_hot_level']),
+                                         str(summary.sustained),
+                                         str(self.config['core_hot_duration']),
+                                         summary.imbalance))
+
+        if summary.sustained < self.config['core_hot_count']:
+            if self.core_alert:
+                info_logger.info('Hot cores below core_hot_count: core '
+                                 'usage warning cleared')
+            self.core_alert = False
+            return
+        if self.core_alert:
+            info_logger.info('Core usage warning already raised: skipping '
+                             'broadcast')
+            return
+
+        self.core_alert = True
+        message = 'Core Usage Warning: {0} cores above {1}% for {2} ' \
+                  'sec'.format(str(summary.sustained),
+                               str(self.config['core_hot_level']),
+                               str(self.config['core_hot_duration']))
+        warning_logger.warning(message)
+        if self.wall_warning:  # Broadcast core usage warning
+            info_logger.info('Queueing broadcast')
+            self.dispatcher.submit('CPU', 'Warning', message)
+
+    def cgroup_check(self):
+        """Checks usage of each cgroup against its own limits
+
+        Host-wide usage says nothing about a container or slice running into
+        its memory.max or cpu.max, so memory and CPU usage of every cgroup
+        with a limit are compared to cgroup_warning_level and
+        cgroup_critical_level percent of that limit, and the pressure of
+        every cgroup to cgroup_pressure_level. Each cgroup and resource
+        alerts once per episode, or again if the level rises.
+        """
+
+        info_logger.info('Determining cgroup usage')
+        usages = self.cgroup_monitor.sample(self.start_time)
+        info_logger.info('Sampled {0} cgroups'.format(str(len(usages))))
+        alerts = {}
+        for usage in usages:
+            name = '/' + os.path.relpath(usage.path,
+                                         self.cgroup_monitor.root)
+            name = '/' if name == '/.' else name
+            readings = (('RAM', usage.memory_percent, 'of memory.max'),
+                        ('CPU', usage.cpu_percent, 'of cpu.max'),
+                        ('RAM', usage.memory_pressure, 'memory pressure'),
+                        ('CPU', usage.cpu_pressure, 'CPU pressure'))
+            for resource, value, description in readings:
+                if value is None:
+                    continue
+                if description.endswith('pressure'):
+                    level = 'Warning' if \
+                        value >= self.config['cgroup_pressure_level'] \
+                        else None
+                elif value >= self.config['cgroup_critical_level']:
+                    level = 'Critical'
+                elif value >= self.config['cgroup_warning_level']:
+                    level = 'Warning'
+                else:
+                    level = None
+                if level is None:
+                    continue
+                key = (usage.path, description)
+                alerts[key] = level
+                if self.cgroup_alerts.get(key) in (level, 'Critical'):
+                    continue  # Already alerted this episode
+                message = 'cgroup {0} {1}: {2} at {3:.1f}% {4}'.format(
+                        resource, level, name, value, description)
+                if level == 'Critical':
+                    critical_logger.critical(message)
+                    wall = self.wall_critical
+                else:
+                    warning_logger.warning(message)
+                    wall = self.wall_warning
+                if wall:  # Broadcast cgroup usage
+                    info_logger.info('Queueing broadcast')
+                    self.dispatcher.submit(resource, level, message)
+        for path, description in set(self.cgroup_alerts).difference(alerts):
+            info_logger.info('cgroup {0} {1} below alert levels: alert '
+                             'cleared'.format(path, description))
+        self.cgroup_alerts = alerts
+
+    def cpu_check(self, pressure=False):
+        """Checks CPU usage, logs and/or broadcasts high usage
+
+        Args:
+            pressure (bool): True if a PSI trigger reported CPU pressure,
+                forces the CPU usage check
+        """
 
         info_logger.info('Determining if CPU usage check is needed')
 
@@ -311,10 +574,10 @@ class ResourceAlerter:
                              'override activated')
         else:
             delta_override_time = self.start_time - self.last_cpu_override
-            debug_logger.debug('CPU override delay time: {0} sec'.format(
-                    str(self.config['cpu_override_delay'])))
-            debug_logger.debug('Time since last CPU-check override: '
-                               '{0} sec'.format(str(delta_override_time)))
+            debug_logger.debug('CPU override delay time: %s sec',
+                               self.config['cpu_override_delay'])
+            debug_logger.debug('Time since last CPU-check override: %s sec',
+                               delta_override_time)
             if delta_override_time >= self.config['cpu_override_delay']:
                 override = True
                 info_logger.info('Time since last override is greater than '
@@ -322,7 +585,7 @@ class ResourceAlerter:
                                  'override activated')
 
         # Skip CPU usage check if PID lists are similar and override inactive
-        if not override and self.pids_same:
+        if not override and not pressure and self.pids_same:
             info_logger.info('PIDs are highly similar to last check and '
                              'CPU-check override is not active: skipping CPU '
                              'usage check')
@@ -340,18 +603,22 @@ class ResourceAlerter:
             info_logger.info('CPU usage has never been checked by this '
                              'instance of resource_alerterd: checking CPU '
                              'usage')
-            psutil.cpu_percent()  # Passing first call silently since it is bad
+            self.sampler.cpu_percent()  # Passing first call silently
             time.sleep(0.25)  # 0.1 sec minimum required after initial check
+            self.sampler.sample()
         elif override:
             check_cpu = True
             info_logger.info('CPU-check override active: checking CPU usage')
+        elif pressure:
+            check_cpu = True
+            info_logger.info('PSI trigger reported CPU pressure: checking CPU '
+                             'usage')
         else:
             delta_check_time = self.start_time - self.last_cpu_check
-            debug_logger.debug('CPU check delay time: {0} sec'.format(
-                    str(self.config['cpu_check_delay'])))
-            debug_logger.debug(
-                    'Time since last CPU check: {0} sec'.format(
-                            str(delta_check_time)))
+            debug_logger.debug('CPU check delay time: %s sec',
+                               self.config['cpu_check_delay'])
+            debug_logger.debug('Time since last CPU check: %s sec',
+                               delta_check_time)
             delta_check_ratio = delta_check_time / self.config[
                 'cpu_check_delay']
             if delta_check_ratio >= 0.95:
@@ -367,9 +634,19 @@ class ResourceAlerter:
         # Check CPU usage and log/broadcast high usage
         if check_cpu:
             info_logger.info('Determining CPU usage')
-            cpu_usage = psutil.cpu_percent()
+            cpu_usage = self.sampler.cpu_percent()
             info_logger.info('CPU Usage: {0}%'.format(str(cpu_usage)))
 
+            # Alert on a statistic of recent samples rather than the sample
+            self.samples['cpu'].add(time.time(), cpu_usage)
+            if self.config['alert_statistic'] != 'last':
+                cpu_usage = round(self.samples['cpu'].statistic(
+                        self.config['alert_statistic']), 1)
+                info_logger.info('CPU Usage ({0} of last {1} samples): '
+                                 '{2}%'.format(self.config['alert_statistic'],
+                                                str(self.samples['cpu'].count),
+                                                str(cpu_usage)))
+
             # See if CPU usage is stable
             info_logger.info('Determining if CPU usage has changed '
                              'significantly since last broadcast')
@@ -402,10 +679,15 @@ class ResourceAlerter:
                     self.stable_cpu_ref = cpu_usage  # Reset reference
                     critical_logger.critical(
                             'CPU Usage Critical: {0}%'.format(str(cpu_usage)))
+                    top = self.attribution('CPU')
+                    if top is not None:
+                        critical_logger.critical(top)
+                    self.alert_fleet('CPU', 'Critical', cpu_usage)
                     if self.wall_critical:  # Broadcast critical CPU usage
                         self.wall(resource='CPU',
                                   level='Critical',
-                                  usage=cpu_usage)
+                                  usage=cpu_usage,
+                                  detail=top)
                     # If broadcast performed under override, reset override
                     if override:
                         self.last_cpu_override = self.start_time
@@ -415,10 +697,15 @@ class ResourceAlerter:
                     self.stable_cpu_ref = cpu_usage  # Reset reference
                     warning_logger.warning('CPU Usage Warning: {0}%'.format(
                             str(cpu_usage)))
+                    top = self.attribution('CPU')
+                    if top is not None:
+                        warning_logger.warning(top)
+                    self.alert_fleet('CPU', 'Warning', cpu_usage)
                     if self.wall_warning:  # Broadcast CPU usage warning
                         self.wall(resource='CPU',
                                   level='Warning',
-                                  usage=cpu_usage)
+                                  usage=cpu_usage,
+                                  detail=top)
                     # If broadcast performed under override, reset override
                     if override:
                         self.last_cpu_override = self.start_time
@@ -436,18 +723,21 @@ class ResourceAlerter:
     def pids_same_test(self):
         """Determine how similar current PIDs are to last resource check"""
 
-        new_pid_list = self.non_kernel_pids(psutil.pids())
+        new_pid_list = self.non_kernel_pids(
+                procfs.list_pids(self.config['proc_root']))
         info_logger.info('Comparing similarity in PID lists since last '
                          'resource check')
-        compare_pids = difflib.SequenceMatcher(None,
-                                               self.old_pid_list,
-                                               new_pid_list)
-        pids_similarity = compare_pids.ratio() * 100.0
-        debug_logger.debug('PID lists similarity: {0}%'.format(str(
-                pids_similarity)))
-        debug_logger.debug('Minimum PID Similarity Permitted: '
-                           '{0}%'.format(self.config['min_pid_same']))
-        self.old_pid_list = new_pid_list[:]  # Replace old list w/ new list
+        pids_similarity = self.pid_set.update(new_pid_list)
+        info_logger.info('PIDs spawned: {0}, PIDs exited: {1}'.format(
+                str(len(self.pid_set.spawned)),
+                str(len(self.pid_set.exited))))
+        if self.process_scanner is not None:
+            self.process_scanner.prune(self.pid_set.exited)
+        if self.process_tree is not None:
+            self.process_tree.prune(self.pid_set.exited)
+        debug_logger.debug('PID lists similarity: %s%%', pids_similarity)
+        debug_logger.debug('Minimum PID Similarity Permitted: %s%%',
+                           self.config['min_pid_same'])
         if pids_similarity <= self.config['min_pid_same']:
             self.pids_same = False
             info_logger.info('PID lists sufficiently different: '
@@ -458,8 +748,13 @@ class ResourceAlerter:
                              'skipping resource checks unless overrides '
                              'activate')
 
-    def ram_check(self):
-        """Checks RAM usage, logs and/or broadcasts high usage"""
+    def ram_check(self, pressure=False):
+        """Checks RAM usage, logs and/or broadcasts high usage
+
+        Args:
+            pressure (bool): True if a PSI trigger reported RAM pressure,
+                forces the RAM usage check
+        """
 
         info_logger.info('Determining if RAM usage check is needed')
 
@@ -473,10 +768,10 @@ class ResourceAlerter:
                              'override activated')
         else:
             delta_override_time = self.start_time - self.last_ram_override
-            debug_logger.debug('RAM override delay time: {0} sec'.format(
-                    str(self.config['ram_override_delay'])))
-            debug_logger.debug('Time since last RAM-check override: '
-                               '{0} sec'.format(str(delta_override_time)))
+            debug_logger.debug('RAM override delay time: %s sec',
+                               self.config['ram_override_delay'])
+            debug_logger.debug('Time since last RAM-check override: %s sec',
+                               delta_override_time)
             if delta_override_time >= self.config['ram_override_delay']:
                 override = True
                 info_logger.info('Time since last override is greater than '
@@ -484,7 +779,7 @@ class ResourceAlerter:
                                  'override activated')
 
         # Skip RAM usage check if PID lists are similar and override inactive
-        if not override and self.pids_same:
+        if not override and not pressure and self.pids_same:
             info_logger.info('PIDs are highly similar to last check and '
                              'RAM-check override is not active: skipping RAM '
                              'usage check')
@@ -505,13 +800,16 @@ class ResourceAlerter:
         elif override:
             check_ram = True
             info_logger.info('RAM-check override active: checking RAM usage')
+        elif pressure:
+            check_ram = True
+            info_logger.info('PSI trigger reported RAM pressure: checking RAM '
+                             'usage')
         else:
             delta_check_time = self.start_time - self.last_ram_check
-            debug_logger.debug('RAM check delay time: {0} sec'.format(
-                    str(self.config['ram_check_delay'])))
-            debug_logger.debug(
-                    'Time since last RAM check: {0} sec'.format(
-                            str(delta_check_time)))
+            debug_logger.debug('RAM check delay time: %s sec',
+                               self.config['ram_check_delay'])
+            debug_logger.debug('Time since last RAM check: %s sec',
+                               delta_check_time)
             delta_check_ratio = delta_check_time / self.config[
                 'ram_check_delay']
             if delta_check_ratio >= 0.95:
@@ -527,9 +825,19 @@ class ResourceAlerter:
         # Check RAM usage and log/broadcast high usage
         if check_ram:
             info_logger.info('Determining RAM usage')
-            ram_usage = psutil.virtual_memory().percent
+            ram_usage = self.sampler.ram_percent()
             info_logger.info('RAM Usage: {0}%'.format(str(ram_usage)))
 
+            # Alert on a statistic of recent samples rather than the sample
+            self.samples['ram'].add(time.time(), ram_usage)
+            if self.config['alert_statistic'] != 'last':
+                ram_usage = round(self.samples['ram'].statistic(
+                        self.config['alert_statistic']), 1)
+                info_logger.info('RAM Usage ({0} of last {1} samples): '
+                                 '{2}%'.format(self.config['alert_statistic'],
+                                                str(self.samples['ram'].count),
+                                                str(ram_usage)))
+
             # See if CPU usage is stable
             info_logger.info('Determining if RAM usage has changed '
                              'significantly since last broadcast')
@@ -562,10 +870,15 @@ class ResourceAlerter:
                     self.stable_ram_ref = ram_usage  # Reset reference
                     critical_logger.critical(
                             'RAM Usage Critical: {0}%'.format(str(ram_usage)))
+                    top = self.attribution('RAM')
+                    if top is not None:
+                        critical_logger.critical(top)
+                    self.alert_fleet('RAM', 'Critical', ram_usage)
                     if self.wall_critical:  # Broadcast critical RAM usage
                         self.wall(resource='RAM',
                                   level='Critical',
-                                  usage=ram_usage)
+                                  usage=ram_usage,
+                                  detail=top)
                     # If broadcast performed under override, reset override
                     if override:
                         self.last_ram_override = self.start_time
@@ -575,10 +888,15 @@ class ResourceAlerter:
                     self.stable_ram_ref = ram_usage  # Reset reference
                     warning_logger.warning('RAM Usage Warning: {0}%'.format(
                             str(ram_usage)))
+                    top = self.attribution('RAM')
+                    if top is not None:
+                        warning_logger.warning(top)
+                    self.alert_fleet('RAM', 'Warning', ram_usage)
                     if self.wall_warning:  # Broadcast RAM usage warning
                         self.wall(resource='RAM',
                                   level='Warning',
-                                  usage=ram_usage)
+                                  usage=ram_usage,
+                                  detail=top)
                     # If broadcast performed under override, reset override
                     if override:
                         self.last_ram_override = self.start_time
@@ -593,39 +911,573 @@ class ResourceAlerter:
         self.last_ram_check = self.start_time
         debug_logger.debug('Reset last RAM check time')
 
+    def scan_processes(self):
+        """Read per-process usage for attributing high usage to processes
+
+        Runs every resource check so that per-process CPU usage is always
+        measured against the previous check. Only the non-kernel PIDs
+        pids_same_test listed are read, so /proc is listed once per check.
+        """
+
+        info_logger.info('Scanning per-process resource usage')
+        self.process_usage = self.process_scanner.scan(self.start_time,
+                                                       self.pid_set.pids)
+        info_logger.info('Scanned {0} processes'.format(
+                str(len(self.process_usage))))
+        if self.process_tree is not None:
+            self.process_tree.update(self.process_usage)
+
+    def attribution(self, resource):
+        """Summarize what is using a resource for alerts
+
+        Args:
+            resource (str): 'CPU' or 'RAM'
+
+        Returns:
+            str: Lines from top_processes and top_trees, None if both are
+                disabled
+        """
+
+        lines = [line for line in (self.top_processes(resource),
+                                   self.top_trees(resource))
+                 if line is not None]
+        return '\n'.join(lines) if lines else None
+
+    def top_processes(self, resource):
+        """Summarize the processes using the most of a resource
+
+        Args:
+            resource (str): 'CPU' or 'RAM'
+
+        Returns:
+            str: Top top_processes processes with their usage, None if
+                process attribution is disabled, nothing was scanned or,
+                for CPU, only one scan was taken
+        """
+
+        usage = self.process_usage
+        if usage is None or not len(usage) or \
+                not self.config['top_processes'] or \
+                (resource == 'CPU' and not usage.cpu_measured):
+            return None
+        if resource == 'CPU':
+            values, unit = usage.cpu, '%'
+        else:
+            values, unit = usage.rss, 'MiB'
+        top = usage.top(self.config['top_processes'], values)
+        return 'Top {0} processes: {1}'.format(
+                resource, ', '.join(usage.describe(i, values, unit)
+                                    for i in top))
+
+    def top_trees(self, resource):
+        """Summarize the process trees and systemd units using the most of a
+        resource
+
+        Args:
+            resource (str): 'CPU' or 'RAM'
+
+        Returns:
+            str: Top top_trees subtrees and units with their usage and
+                number of processes, None if disabled, nothing was scanned
+                or, for CPU, only one scan was taken
+        """
+
+        usage = self.process_usage
+        if self.process_tree is None or usage is None or not len(usage) or \
+                (resource == 'CPU' and not usage.cpu_measured):
+            return None
+        if resource == 'CPU':
+            values, unit = usage.cpu, '%'
+        else:
+            values, unit = usage.rss, 'MiB'
+        names = dict(zip(usage.pids, usage.names))
+        trees = ['{0} ({1}) +{2}: {3}'.format(
+                names[pid].decode('utf-8', 'replace'), str(pid),
+                str(processes - 1), format_usage(total, unit))
+                for pid, total, processes in self.process_tree.heaviest(
+                        usage, values, self.config['top_trees'])]
+        units = ['{0} ({1}): {2}'.format(name, str(processes),
+                                         format_usage(total, unit))
+                 for name, total, processes in self.process_tree.by_unit(
+                        usage, values, self.config['top_trees'])]
+        return 'Top {0} process trees: {1}\nTop {0} units: {2}'.format(
+                resource, ', '.join(trees), ', '.join(units))
+
+    @staticmethod
+    def user_name(uid):
+        """Look up the login name of a user ID
+
+        Args:
+            uid (int): User ID
+
+        Returns:
+            str: Login name, the user ID itself if it has no passwd entry
+        """
+
+        try:
+            return pwd.getpwuid(uid).pw_name
+        except KeyError:
+            return str(uid)
+
+    def user_check(self):
+        """Checks per-user shares of the host, logs and/or broadcasts hogs
+
+        CPU and RSS are summed per user by the process scan of this
+        resource check. A warning naming the user is raised when a user
+        holds more than user_share_level percent of all CPU cores or of
+        RAM, once per episode per user and resource.
+        """
+
+        usage = self.process_usage
+        if usage is None or not len(usage):
+            info_logger.info('No per-process usage: skipping per-user usage '
+                             'check')
+            return
+        info_logger.info('Determining per-user resource usage')
+        cpu_capacity = psutil.cpu_count() * 100.0
+        ram_capacity = float(psutil.virtual_memory().total)
+        level = self.config['user_share_level']
+        alerts = set()
+        for uid, (cpu, rss, processes) in usage.users.items():
+            shares = (('CPU', cpu * 100.0 / cpu_capacity),
+                      ('RAM', rss * 100.0 / ram_capacity))
+            for resource, share in shares:
+                if share <= level:
+                    continue
+                alerts.add((uid, resource))
+                if (uid, resource) in self.user_alerts:
+                    continue
+                message = 'User {0} Warning: {1} is using {2:.1f}% of {0} ' \
+                          'across {3} processes'.format(resource,
+                                                        self.user_name(uid),
+                                                        share,
+                                                        str(processes))
+                warning_logger.warning(message)
+                if self.wall_warning:  # Broadcast per-user warning
+                    info_logger.info('Queueing broadcast')
+                    self.dispatcher.submit(resource, 'Warning', message)
+        for uid, resource in self.user_alerts.difference(alerts):
+            info_logger.info('User {0} share of {1} at or below '
+                             'user_share_level: warning cleared'.format(
+                                     self.user_name(uid), resource))
+        info_logger.info('Users above {0}% of CPU or RAM: {1}'.format(
+                str(level), str(len(set(uid for uid, _ in alerts)))))
+        self.user_alerts = alerts
+
+    def alert_fleet(self, resource, level, usage):
+        """Queue an alert for the fleet aggregator if one is configured
+
+        Args:
+            resource (str): 'CPU' or 'RAM'
+
+            level (str): 'Warning' or 'Critical'
+
+            usage (float): Usage in percent
+        """
+
+        if self.fleet is not None:
+            self.fleet.alert(time.time(), resource, level, usage)
+
+    def push_fleet(self, tick_time):
+        """Send samples taken during this resource check to the aggregator
+
+        Each sample carries the level it reached against this host's own
+        warning and critical levels, from which the aggregator computes
+        fleet alerts. Alerts queued during the check go in the same
+        datagram.
+
+        Args:
+            tick_time (float): Start of the check in seconds since Epoch
+        """
+
+        for metric in ('cpu', 'ram'):
+            ring = self.samples[metric]
+            if not ring.count or ring.last_time < tick_time:
+                continue
+            self.fleet.sample(ring.last_time, metric.upper(), ring.last,
+                              self.alert_level(metric))
+        self.fleet.flush()
+
+    def alert_level(self, metric):
+        """Level the last sample of a metric reached
+
+        Args:
+            metric (str): 'cpu' or 'ram'
+
+        Returns:
+            str: 'Critical' or 'Warning', None if below both levels or never
+                sampled
+        """
+
+        last = self.samples[metric].last
+        if last is None:
+            return None
+        if last >= self.config[metric + '_critical_level']:
+            return 'Critical'
+        elif last >= self.config[metric + '_warning_level']:
+            return 'Warning'
+        return None
+
+    def active_alerts(self):
+        """Count alerts raised and not yet cleared
+
+        Returns:
+            dict: Maps 'cgroup', 'core' and 'user' to their number of
+                active alerts
+        """
+
+        return {'cgroup': len(self.cgroup_alerts),
+                'core': int(self.core_alert),
+                'user': len(self.user_alerts)}
+
+    def publish_live_stats(self, tick_time):
+        """Write this resource check to the live stats file
+
+        Args:
+            tick_time (float): Start of the check in seconds since Epoch
+        """
+
+        nan = float('nan')
+        values = [tick_time, os.getpid()]
+        for metric in ('cpu', 'ram'):
+            ring = self.samples[metric]
+            values.extend((
+                    ring.last_time if ring.count else nan,
+                    ring.last if ring.count else nan,
+                    ring.ewma if ring.count else nan,
+                    LEVELS.index(self.alert_level(metric)),
+                    self.config[metric + '_warning_level'],
+                    self.config[metric + '_critical_level']))
+        alerts = self.active_alerts()
+        values.extend((alerts['cgroup'], alerts['core'], alerts['user']))
+        self.live_stats.publish(values)
+
+    def publish_metrics(self, tick_time):
+        """Render metrics of this resource check for the metrics endpoint
+
+        Args:
+            tick_time (float): Start of the check in seconds since Epoch
+        """
+
+        page = MetricsPage()
+        resources = ('cpu', 'ram')
+        rings = [(metric, self.samples[metric]) for metric in resources]
+        page.metric('resource_alerter_usage_percent', 'gauge',
+                    'Last sampled usage.',
+                    [('', (('resource', metric),), ring.last)
+                     for metric, ring in rings])
+        page.metric('resource_alerter_usage_statistic_percent', 'gauge',
+                    'Statistics of the last sample_history samples.',
+                    [('', (('resource', metric), ('statistic', name)),
+                      ring.statistic(name))
+                     for metric, ring in rings for name in STATISTICS
+                     if name != 'last'])
+        page.metric('resource_alerter_sample_timestamp_seconds', 'gauge',
+                    'Time of the last sample.',
+                    [('', (('resource', metric),), ring.last_time)
+                     for metric, ring in rings])
+        page.metric('resource_alerter_alert_level', 'gauge',
+                    'Level reached by the last sample: 0 none, 1 warning, '
+                    '2 critical.',
+                    [('', (('resource', metric),),
+                      LEVELS.index(self.alert_level(metric)))
+                     for metric in resources])
+        page.metric('resource_alerter_threshold_percent', 'gauge',
+                    'Configured alert levels.',
+                    [('', (('resource', metric), ('level', level)),
+                      self.config['{0}_{1}_level'.format(metric, level)])
+                     for metric in resources
+                     for level in ('warning', 'critical')])
+        page.metric('resource_alerter_active_alerts', 'gauge',
+                    'Alerts raised and not yet cleared.',
+                    [('', (('kind', kind),), count)
+                     for kind, count in sorted(self.active_alerts().items())])
+        page.metric('resource_alerter_last_check_timestamp_seconds', 'gauge',
+                    'Start of the last resource check.',
+                    [('', (), tick_time)])
+        if self.self_stats is not None:
+            usage = self.self_stats.usage()
+            page.metric('resource_alerter_self_cpu_seconds_total', 'counter',
+                        'CPU time used by resource_alerterd.',
+                        [('', (('mode', 'user'),), usage['cpu_user_s']),
+                         ('', (('mode', 'system'),), usage['cpu_system_s'])])
+            page.metric('resource_alerter_self_rss_bytes', 'gauge',
+                        'Resident memory of resource_alerterd.',
+                        [('', (), usage['rss_bytes'])])
+            page.metric('resource_alerter_self_max_rss_bytes', 'gauge',
+                        'Peak resident memory of resource_alerterd.',
+                        [('', (), usage['max_rss_bytes'])])
+            page.histograms('resource_alerter_phase_duration_seconds',
+                            'Duration of each phase of resource checks.',
+                            'phase', self.self_stats.phases)
+        self.metrics.publish(page.render())
+
+    def record_history(self, tick_time):
+        """Append samples taken during this resource check to history
+
+        Metrics that were not sampled during this check are stored as NaN.
+
+        Args:
+            tick_time (float): Start of the check in seconds since Epoch
+        """
+
+        values = []
+        for metric in METRICS:
+            ring = self.samples[metric]
+            if ring.count and ring.last_time >= tick_time:
+                values.append(ring.last)
+            else:
+                values.append(float('nan'))
+        self.history.append(tick_time, tuple(values))
+
+    def register_check(self, name, check, period):
+        """Schedule a resource check to run every period seconds
+
+        Args:
+            name (str): Name of the check used in logs
+
+            check (function): Method performing the check, called with no
+                arguments unless a PSI trigger fired for it
+
+            period (float): Seconds between checks
+        """
+
+        self.checks[name] = check
+        self.scheduler.register(name, period)
+        debug_logger.debug('Scheduled %s check every %s sec', name, period)
+
+    def tick(self, pressured=frozenset()):
+        """Perform one resource check: sample, then run due checks
+
+        Args:
+            pressured (set): Names of checks a PSI trigger fired for, run
+                with pressure=True whether due or not
+        """
+
+        # Time each phase if requested, each record returns the next start
+        record = untimed if self.self_stats is None else \
+            self.self_stats.record
+        phase_start = tick_start = time.perf_counter_ns()
+        cpu_start = time.process_time_ns()
+
+        # Pre-resource check necessities
+        self.start_time = time.monotonic()
+        tick_time = time.time()
+        info_logger.info('Starting resource check')
+        self.pids_same_test()
+        phase_start = record('pids_same_test', phase_start)
+        self.sampler.sample()  # One read of usage serves every check
+        phase_start = record('sample', phase_start)
+        if self.process_scanner is not None:
+            self.scan_processes()
+            phase_start = record('scan_processes', phase_start)
+
+        # Run resource checks that are due or under pressure
+        due = []
+        for name, lag in self.scheduler.pop_due(self.start_time):
+            due.append(name)
+            debug_logger.debug('%s check lag: %s sec', name, lag)
+            if lag > 1.0:
+                info_logger.info('{0} check running {1} sec behind '
+                                 'schedule'.format(name, str(lag)))
+        due.extend(sorted(set(pressured).difference(due)))
+        for name in due:
+            if name in pressured:
+                self.checks[name](pressure=True)
+            else:
+                self.checks[name]()
+            phase_start = record(name + '_check', phase_start)
+        self.dispatcher.flush()  # Broadcast in background, never blocks
+        phase_start = record('dispatch', phase_start)
+        if self.history is not None:
+            self.record_history(tick_time)
+            phase_start = record('history', phase_start)
+        if self.fleet is not None:
+            self.push_fleet(tick_time)
+            phase_start = record('fleet', phase_start)
+        if self.metrics is not None:
+            self.publish_metrics(tick_time)
+            phase_start = record('metrics', phase_start)
+        if self.query is not None:
+            self.query.publish(tick_time, self.samples,
+                               dict((metric, self.alert_level(metric))
+                                    for metric in self.samples),
+                               self.active_alerts())
+            phase_start = record('query', phase_start)
+        if self.live_stats is not None:
+            self.publish_live_stats(tick_time)
+            record('live_stats', phase_start)
+        info_logger.info('Resource check complete')
+        if self.self_stats is not None:
+            self.self_stats.phase('tick').record(
+                    time.perf_counter_ns() - tick_start)
+            self.self_stats.phase('tick_cpu').record(
+                    time.process_time_ns() - cpu_start)
+
+    def dump_self_stats(self, signum=None, frame=None):
+        """Write the self_stats snapshot to self_stats_path
+
+        Installed as the SIGUSR1 handler, so the snapshot is taken without
+        stopping the daemon.
+
+        Args:
+            signum (int): Signal number, unused
+
+            frame (frame): Interrupted stack frame, unused
+        """
+
+        if self.self_stats is None:
+            info_logger.info('self_stats disabled: no snapshot written')
+            return
+        try:
+            self.self_stats.dump(self.self_stats_path)
+            info_logger.info('Wrote self_stats snapshot to {0}'.format(
+                    self.self_stats_path))
+        except (IOError, OSError) as error:
+            error_logger.error('Cannot write self_stats snapshot to {0}: '
+                               '{1}'.format(self.self_stats_path, str(error)))
+
+    def terminate(self, signum=None, frame=None):
+        """Exit through SystemExit so that atexit handlers run
+
+        Installed as the SIGTERM handler, whose default action would kill
+        the process before the log listener writes its queued records.
+
+        Args:
+            signum (int): Signal number, unused
+
+            frame (frame): Interrupted stack frame, unused
+        """
+
+        info_logger.info('Received SIGTERM: exiting')
+        raise SystemExit(0)  # A requested stop, not a failure
+
     def run(self):
         """Main loop for daemon"""
 
+        # Time work done by background threads, their histograms must
+        # exist before the threads start
+        if self.self_stats is not None:
+            if self.log_listener is not None:
+                self.log_listener.flush_timings = \
+                    self.self_stats.phase('log_flush')
+            self.dispatcher.broadcast_timings = \
+                self.self_stats.phase('broadcast')
+            signal.signal(signal.SIGUSR1, self.dump_self_stats)
+        signal.signal(signal.SIGTERM, self.terminate)
+
+        # Serve metrics, sockets are opened after daemon-ization
+        if self.metrics is not None:
+            try:
+                self.metrics.open()
+                self.metrics.start()
+                info_logger.info('Serving metrics on {0}'.format(
+                        self.metrics.listen))
+            except (IOError, OSError) as error:
+                error_logger.error('Cannot serve metrics on {0}: {1}'.format(
+                        self.metrics.listen, str(error)))
+                self.metrics = None
+
+        # Publish each check for local readers
+        if self.live_stats is not None:
+            try:
+                self.live_stats.open()
+                info_logger.info('Publishing resource checks to {0}'.format(
+                        self.live_stats.path))
+            except (IOError, OSError) as error:
+                error_logger.error('Cannot publish resource checks to {0}: '
+                                   '{1}'.format(self.live_stats.path,
+                                                str(error)))
+                self.live_stats = None
+
+        # Answer queries about recent samples
+        if self.query is not None:
+            try:
+                self.query.open()
+                self.query.start()
+                info_logger.info('Answering queries on {0}'.format(
+                        self.query.path))
+            except (IOError, OSError) as error:
+                error_logger.error('Cannot answer queries on {0}: {1}'.format(
+                        self.query.path, str(error)))
+                self.query = None
+
+        # Start writing queued logs, threads do not survive daemon-ization
+        if self.log_listener is not None:
+            self.log_listener.start()
+
         # See if OS has 'wall' command to broadcast resource usage
         self.check_wall()
+        self.dispatcher.start()
+
+        # Map sample history file, kept across restarts
+        if self.history is not None:
+            self.history.open()
+            info_logger.info('Recording sample history to {0}: {1} '
+                             'records stored'.format(self.history.path,
+                                                     str(len(self.history))))
+
+        # Register PSI triggers if requested, else fall back to polling
+        if self.config['psi_wakeups']:
+            self.pressure = PressureMonitor(
+                    {'cpu': (self.config['cpu_psi_stall'],
+                             self.config['psi_window']),
+                     'ram': (self.config['ram_psi_stall'],
+                             self.config['psi_window'])},
+                    self.config['proc_root'])
+            if self.pressure.open():
+                info_logger.info('PSI triggers registered: waking on '
+                                 'resource pressure')
+            else:
+                self.pressure = None
+                info_logger.info('PSI unavailable: polling resource usage')
+
+        # Schedule resource checks, PSI triggers replace periodic checks
+        # between overrides
+        if self.pressure is None:
+            self.register_check('cpu', self.cpu_check,
+                                self.config['cpu_check_delay'])
+            self.register_check('ram', self.ram_check,
+                                self.config['ram_check_delay'])
+        else:
+            self.register_check('cpu', self.cpu_check,
+                                self.config['cpu_override_delay'])
+            self.register_check('ram', self.ram_check,
+                                self.config['ram_override_delay'])
+        if self.cgroup_monitor is not None:
+            if self.cgroup_monitor.open():
+                info_logger.info('Watching {0} for cgroups with '
+                                 'inotify'.format(self.cgroup_monitor.root))
+            else:
+                info_logger.info('inotify unavailable: walking {0} every '
+                                 'cgroup check'.format(
+                                         self.cgroup_monitor.root))
+            self.register_check('cgroup', self.cgroup_check,
+                                self.config['cgroup_check_delay'])
+        if self.config['core_check']:
+            self.register_check('core', self.core_check,
+                                self.config['core_check_delay'])
+        if self.config['user_check']:
+            self.register_check('user', self.user_check,
+                                self.config['user_check_delay'])
 
         # Main daemon
+        pressured = set()
         while True:
-            # Pre-resource check necessities
-            self.start_time = time.time()
-            info_logger.info('Starting resource check')
-            self.pids_same_test()
-
-            # Run resource checks
-            self.cpu_check()
-            self.ram_check()
-            info_logger.info('Resource check complete')
-
-            # Determine sleep time until next resource check
-            time.sleep(self.sleep_time())
-
-    def sleep_time(self):
-        """Calculate time until next resource check is required"""
-
-        debug_logger.debug('Calculating time until next resource check')
-        next_cpu_check = self.last_cpu_check + config_dict['cpu_check_delay']
-        next_ram_check = self.last_ram_check + config_dict['ram_check_delay']
-        next_resource_check = min(next_cpu_check,
-                                  next_ram_check)
-        sleep_time = float(next_resource_check - time.time())
-        sleep_time = 0 if sleep_time < 0 else sleep_time  # Avoid negatives
-        info_logger.info('Sleeping for {0} sec'.format(str(sleep_time)))
-        return sleep_time
+            self.tick(pressured)
+
+            # Sleep until next resource check or until PSI trigger fires
+            sleep_time = self.scheduler.sleep_time()
+            info_logger.info('Sleeping for up to {0} sec'.format(
+                    str(sleep_time)))
+            if self.pressure is None:
+                pressured = set()
+                time.sleep(sleep_time)
+            else:
+                pressured = self.pressure.wait(sleep_time)
+                if pressured:
+                    info_logger.info('PSI trigger fired for: {0}'.format(
+                            ', '.join(sorted(pressured))))
 
 
 if __name__ == '__main__':
@@ -640,33 +1492,61 @@ if __name__ == '__main__':
     if not os.path.isdir(logging_folder):
         os.mkdir(logging_folder)
 
-    # Parse configuration file and instantiate class
-    config_file = resource_stream('resource_alerter', 'resource_alerterd.conf')
-    config_dict = yaml.load(config_file)
+    # Parse configuration file, or reuse its cached snapshot, and
+    # instantiate class
+    config_dict = config_loader.load('resource_alerterd.conf',
+                                     validator=config_loader.validate,
+                                     cache_folder=runtime_folder)
     resource_alerter = ResourceAlerter(config_dict)
 
+    # Test for history folder and create if needed
+    if config_dict['history_file']:
+        history_folder = os.path.dirname(config_dict['history_file'])
+        if not os.path.isdir(history_folder):
+            os.mkdir(history_folder)
+
     # Parse logging config file and create loggers
-    log_config_file = resource_stream('resource_alerter',
-                                      'resource_alerterd.logging.conf')
-    logging_config_dict = yaml.load(log_config_file)
+    logging_config_dict = config_loader.load('resource_alerterd.logging.conf',
+                                             cache_folder=runtime_folder)
     logging.config.dictConfig(logging_config_dict)
-    debug_logger = logging.getLogger('debug_logger')
-    info_logger = logging.getLogger('info_logger')
-    warning_logger = logging.getLogger('warning_logger')
-    error_logger = logging.getLogger('error_logger')
-    critical_logger = logging.getLogger('critical_logger')
     loggers = [debug_logger, info_logger, warning_logger, error_logger,
                critical_logger]
 
-    # Run resource_alerterd in systemd-compatible mode else daemonize
+    # Format and write logs from a background thread if requested
+    if config_dict['async_logging']:
+        resource_alerter.log_listener = BatchingLogListener(
+                loggers,
+                flush_interval=config_dict['log_flush_interval'],
+                flush_bytes=config_dict['log_flush_bytes'])
+
+    # Run resource_alerterd in systemd-compatible mode, as the fleet
+    # aggregator in the foreground, else daemonize
     if sys.argv[1] == '--systemd':
         resource_alerter.run()
+    elif sys.argv[1] == '--aggregator':
+        signal.signal(signal.SIGTERM, resource_alerter.terminate)
+        if resource_alerter.log_listener is not None:
+            resource_alerter.log_listener.start()
+        aggregator = FleetAggregator(
+                config_dict['fleet_listen'],
+                capacity=config_dict['sample_history'],
+                alert_share=config_dict['fleet_alert_share'],
+                stale_after=config_dict['fleet_stale_after'],
+                forget_after=config_dict['fleet_forget_after'],
+                max_hosts=config_dict['fleet_max_hosts'])
+        aggregator.open()
+        info_logger.info('Aggregating fleet samples on {0}'.format(
+                config_dict['fleet_listen']))
+        aggregator.serve(config_dict['fleet_check_delay'])
     else:
         # Ensure that logging files are available after daemon-ization
         files_to_preserve = []
         for logger in loggers:
-            for i in range(len(logger.handlers)):
-                file_stream = logger.handlers[i].stream
+            handlers = logger.handlers
+            if resource_alerter.log_listener is not None:
+                handlers = resource_alerter.log_listener.routes[logger.name]
+            for handler in handlers:
+                file_stream = handler.stream
                 if file_stream not in files_to_preserve:
                     files_to_preserve.append(file_stream)
 
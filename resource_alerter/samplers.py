@@ -0,0 +1,256 @@
+#! /usr/bin/env python
+
+"""Backends that sample host-wide CPU and RAM usage
+
+Copyright:
+
+    samplers.py sample host-wide CPU and RAM usage
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import psutil
+from resource_alerter import cores, procfs
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+
+class PsutilSampler:
+    """Samples CPU and RAM usage through psutil
+
+    Every call to cpu_percent or ram_percent re-reads the relevant /proc
+    file through psutil; sample is a no-op kept for interface parity with
+    ProcSampler.
+    """
+
+    def sample(self):
+        """Nothing to do, psutil reads /proc on every call"""
+
+        pass
+
+    @staticmethod
+    def cpu_percent():
+        """CPU usage in percent since the last call
+
+        Returns:
+            float: CPU usage percent, meaningless on the first call
+        """
+
+        return psutil.cpu_percent()
+
+    @staticmethod
+    def core_times():
+        """Busy and total CPU time of each core
+
+        Returns:
+            tuple: (busy, total) as returned by cores.busy_total
+        """
+
+        return cores.busy_total([tuple(times) for times in
+                                 psutil.cpu_times(percpu=True)])
+
+    @staticmethod
+    def ram_percent():
+        """Current RAM usage in percent
+
+        Returns:
+            float: Percent of RAM not available to new processes
+        """
+
+        return psutil.virtual_memory().percent
+
+
+class ProcSampler:
+    """Samples CPU and RAM usage from permanently open /proc files
+
+    /proc/stat and /proc/meminfo are opened once and re-read with a
+    positional read into preallocated buffers, one read of each per call to
+    sample. Only the aggregate CPU line and the MemTotal and MemAvailable
+    fields are parsed. Results match those of psutil on Linux.
+
+    Files are opened lazily on the first call to sample so that they survive
+    daemon-ization, which closes every open file descriptor.
+
+    Attributes:
+        meminfo_buffer (bytearray): Buffer holding the last /proc/meminfo
+            read
+
+        meminfo_length (int): Number of valid bytes in meminfo_buffer
+
+        stat_buffer (bytearray): Buffer holding the last /proc/stat read
+
+        stat_length (int): Number of valid bytes in stat_buffer
+    """
+
+    def __init__(self, proc_root=None):
+        """Preallocate read buffers
+
+        Args:
+            proc_root (str): Mount point of procfs, defaults to
+                procfs.PROC_ROOT
+        """
+
+        self.proc_root = procfs.PROC_ROOT if proc_root is None else proc_root
+        self.meminfo_buffer = bytearray(4096)
+        self.meminfo_fd = None
+        self.meminfo_length = 0
+        self.stat_buffer = bytearray(16384)
+        self.stat_fd = None
+        self.stat_length = 0
+        self._last_busy = None
+        self._last_total = None
+
+    @staticmethod
+    def _pread(fd, buffer):
+        """Read an entire /proc file into buffer from offset zero
+
+        Args:
+            fd (int): Open file descriptor of the /proc file
+
+            buffer (bytearray): Buffer to read into, grown in place if the
+                file does not fit
+
+        Returns:
+            int: Number of bytes read into buffer
+        """
+
+        while True:
+            length = os.preadv(fd, [buffer], 0)
+            if length < len(buffer):
+                return length
+            buffer.extend(bytes(len(buffer)))  # File did not fit, grow
+
+    def close(self):
+        """Close /proc files if they are open"""
+
+        for fd in (self.stat_fd, self.meminfo_fd):
+            if fd is not None:
+                os.close(fd)
+        self.stat_fd = None
+        self.meminfo_fd = None
+
+    def sample(self):
+        """Read /proc/stat and /proc/meminfo once for the current check"""
+
+        if self.stat_fd is None:
+            self.stat_fd = os.open(os.path.join(self.proc_root, 'stat'),
+                                   os.O_RDONLY)
+            self.meminfo_fd = os.open(os.path.join(self.proc_root, 'meminfo'),
+                                      os.O_RDONLY)
+        self.stat_length = self._pread(self.stat_fd, self.stat_buffer)
+        self.meminfo_length = self._pread(self.meminfo_fd,
+                                          self.meminfo_buffer)
+
+    def cpu_percent(self):
+        """CPU usage in percent between this and the last call
+
+        Returns:
+            float: CPU usage percent, 0.0 on the first call
+        """
+
+        buffer = self.stat_buffer
+        times = [int(i) for i in buffer[3:buffer.find(b'\n')].split()]
+        total = sum(times)
+        if len(times) > 8:  # Guest time is already counted in user time
+            total -= sum(times[8:10])
+        busy = total - times[3] - (times[4] if len(times) > 4 else 0)
+
+        last_busy = self._last_busy
+        last_total = self._last_total
+        self._last_busy = busy
+        self._last_total = total
+        if last_total is None or total <= last_total:
+            return 0.0
+        busy_delta = max(busy - last_busy, 0)
+        return round(busy_delta * 100.0 / (total - last_total), 1)
+
+    def core_times(self):
+        """Busy and total CPU time of each core as of the last sample
+
+        The per-core lines are parsed from the same /proc/stat read that
+        serves cpu_percent.
+
+        Returns:
+            tuple: (busy, total) as returned by cores.busy_total
+        """
+
+        buffer = self.stat_buffer
+        start = buffer.find(b'\ncpu0', 0, self.stat_length) + 1
+        end = buffer.find(b'\nintr', start, self.stat_length)
+        if end < 0:  # No interrupt line, assume core lines run to the end
+            end = self.stat_length
+        return cores.parse_core_lines(bytes(buffer[start:end]))
+
+    def meminfo_field(self, field):
+        """Value of a single field of the last /proc/meminfo read
+
+        Args:
+            field (bytes): Field name including the trailing colon
+
+        Returns:
+            int: Field value in kB, None if field is absent
+        """
+
+        buffer = self.meminfo_buffer
+        start = buffer.find(field, 0, self.meminfo_length)
+        if start < 0:
+            return None
+        start += len(field)
+        return int(buffer[start:buffer.find(b'k', start)])
+
+    def ram_percent(self):
+        """RAM usage in percent as of the last call to sample
+
+        Returns:
+            float: Percent of RAM not available to new processes
+        """
+
+        total = self.meminfo_field(b'MemTotal:')
+        available = self.meminfo_field(b'MemAvailable:')
+        if available is None:  # Kernels older than 3.14
+            available = self.meminfo_field(b'MemFree:') \
+                        + self.meminfo_field(b'Buffers:') \
+                        + self.meminfo_field(b'Cached:')
+        return round((total - available) * 100.0 / total, 1)
+
+
+def make_sampler(backend, proc_root=None):
+    """Instantiate the sampler named in resource_alerterd.conf
+
+    Args:
+        backend (str): 'native' for ProcSampler, 'psutil' for PsutilSampler
+
+        proc_root (str): Mount point of procfs read by ProcSampler, psutil
+            always reads /proc
+
+    Returns:
+        PsutilSampler or ProcSampler: CPU and RAM usage sampler
+
+    Raises:
+        ValueError: If backend is not a known sampler
+    """
+
+    if backend == 'native':
+        return ProcSampler(proc_root)
+    elif backend == 'psutil':
+        return PsutilSampler()
+    raise ValueError('Unknown sampler "{0}": must be "native" or '
+                     '"psutil"'.format(backend))
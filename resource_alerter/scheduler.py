@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+
+"""Deadline scheduler for periodic resource checks
+
+Copyright:
+
+    scheduler.py schedule periodic resource checks
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import heapq
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+
+class DeadlineScheduler:
+    """Min-heap of absolute, monotonic deadlines for named periodic tasks
+
+    Deadlines advance by whole periods from where they started rather than
+    from when a task actually ran, so a task that runs late does not push
+    every later run back with it. Periods missed entirely are skipped and
+    reported as lag instead of being run back-to-back.
+
+    Attributes:
+        clock (function): Monotonic clock returning seconds as a float
+
+        heap (list): Heap of [deadline, order, name, period] entries
+    """
+
+    def __init__(self, clock=time.monotonic):
+        """Initialize a scheduler with no tasks
+
+        Args:
+            clock (function): Monotonic clock returning seconds as a float
+        """
+
+        self.clock = clock
+        self.heap = []
+        self._order = 0  # Runs tasks with equal deadlines in register order
+
+    def register(self, name, period, first_deadline=None):
+        """Schedule name to come due every period seconds
+
+        Args:
+            name (str): Task name returned by pop_due
+
+            period (float): Seconds between deadlines, tasks with a period
+                of zero or less come due on every call to pop_due
+
+            first_deadline (float): First deadline on the scheduler's clock,
+                defaults to now
+        """
+
+        if first_deadline is None:
+            first_deadline = self.clock()
+        heapq.heappush(self.heap,
+                       [first_deadline, self._order, name, float(period)])
+        self._order += 1
+
+    def pop_due(self, now=None):
+        """Return every task whose deadline has passed and reschedule it
+
+        Args:
+            now (float): Current time on the scheduler's clock, defaults to
+                calling the clock
+
+        Returns:
+            list: (name, lag) tuples in deadline order, lag being how many
+                seconds past its deadline the task is being run
+        """
+
+        if now is None:
+            now = self.clock()
+        heap = self.heap
+        due = []
+        while heap and heap[0][0] <= now:
+            due.append(heapq.heappop(heap))
+
+        due_names = []
+        for entry in due:
+            deadline, order, name, period = entry
+            due_names.append((name, now - deadline))
+            if period > 0.0:
+                # Advance by whole periods, skipping any that were missed
+                missed = int((now - deadline) // period)
+                entry[0] = deadline + (missed + 1) * period
+            else:
+                entry[0] = now
+            heapq.heappush(heap, entry)
+        return due_names
+
+    def sleep_time(self, now=None):
+        """Seconds until the earliest deadline
+
+        Args:
+            now (float): Current time on the scheduler's clock, defaults to
+                calling the clock
+
+        Returns:
+            float: Seconds until the next task comes due, never negative,
+                None if no task is registered
+        """
+
+        if not self.heap:
+            return None
+        if now is None:
+            now = self.clock()
+        return max(self.heap[0][0] - now, 0.0)
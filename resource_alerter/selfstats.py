@@ -0,0 +1,244 @@
+#! /usr/bin/env python
+
+"""Measures where resource_alerterd itself spends its time and memory
+
+Copyright:
+
+    selfstats.py time resource_alerterd phases and track its own usage
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+import json
+import os
+import resource
+import time
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Power-of-two histogram buckets of nanoseconds, the last holds 2**38 ns
+# (about 4.6 min) and up
+BUCKETS = 40
+
+perf_counter_ns = time.perf_counter_ns  # Saves an attribute lookup per phase
+
+
+def untimed(name, start):
+    """Stand-in for SelfStats.record when phase timing is disabled"""
+
+    return 0
+
+
+class PhaseHistogram:
+    """Durations of one phase in fixed memory
+
+    The last capacity durations are kept in a ring for percentiles of recent
+    behavior, and every duration ever recorded is counted in a power-of-two
+    histogram. Recording is a few array stores, no allocation.
+
+    Attributes:
+        buckets (array): Count of durations per bucket, bucket i holding
+            durations below 2**i nanoseconds and at or above 2**(i - 1)
+
+        count (int): Number of durations ever recorded
+
+        durations (array): Ring of the last capacity durations in
+            nanoseconds
+
+        total (int): Sum of every duration ever recorded in nanoseconds
+    """
+
+    def __init__(self, capacity):
+        """Preallocate storage for capacity durations
+
+        Args:
+            capacity (int): Number of durations kept for percentiles
+        """
+
+        self.buckets = array('Q', bytes(8 * BUCKETS))
+        self.capacity = int(capacity)
+        self.count = 0
+        self.durations = array('q', bytes(8 * self.capacity))
+        self.total = 0
+
+    def record(self, duration):
+        """Add one duration
+
+        Args:
+            duration (int): Duration in nanoseconds
+        """
+
+        self.durations[self.count % self.capacity] = duration
+        index = duration.bit_length()
+        self.buckets[index if index < BUCKETS else BUCKETS - 1] += 1
+        self.count += 1
+        self.total += duration
+
+    def window(self):
+        """Durations kept in the ring, in no particular order
+
+        Returns:
+            array: Up to capacity durations in nanoseconds
+        """
+
+        return self.durations[:min(self.count, self.capacity)]
+
+    def snapshot(self):
+        """Summary of the histogram
+
+        Returns:
+            dict: Lifetime count and total, mean, median, 99th percentile
+                and maximum of the ring in microseconds, and non-empty
+                buckets as [upper bound in nanoseconds, count] pairs
+        """
+
+        window = sorted(self.window())
+        summary = {'count': self.count,
+                   'total_ms': round(self.total / 1e6, 3),
+                   'histogram': [[2 ** index, count] for index, count in
+                                 enumerate(self.buckets) if count]}
+        if window:
+            summary.update({
+                    'window': len(window),
+                    'mean_us': round(sum(window) / len(window) / 1e3, 1),
+                    'p50_us': round(window[(len(window) - 1) // 2] / 1e3, 1),
+                    'p99_us': round(window[(len(window) * 99 - 1) // 100] /
+                                    1e3, 1),
+                    'max_us': round(window[-1] / 1e3, 1)})
+        return summary
+
+
+class SelfStats:
+    """Phase timings and CPU and memory usage of the daemon itself
+
+    Phases are timed by chaining perf_counter_ns readings through record,
+    so consecutive phases cost one clock read each. Resource usage of the
+    process is only read when a snapshot is taken.
+
+    Attributes:
+        capacity (int): Number of recent durations kept per phase
+
+        phases (dict): Maps phase names to PhaseHistogram
+
+        started (float): Time the daemon started in seconds since Epoch
+    """
+
+    def __init__(self, capacity=1024):
+        """Initialize without any phases
+
+        Args:
+            capacity (int): Number of recent durations kept per phase
+        """
+
+        self.capacity = capacity
+        self.phases = {}
+        self.started = time.time()
+
+    def phase(self, name):
+        """Histogram of a phase, created on first use
+
+        Phases recorded from threads other than the main loop should be
+        created up front, before those threads start.
+
+        Args:
+            name (str): Name of the phase
+
+        Returns:
+            PhaseHistogram: Histogram of the phase
+        """
+
+        histogram = self.phases.get(name)
+        if histogram is None:
+            histogram = PhaseHistogram(self.capacity)
+            self.phases[name] = histogram
+        return histogram
+
+    def record(self, name, start):
+        """Record the duration of a phase ending now
+
+        Args:
+            name (str): Name of the phase
+
+            start (int): perf_counter_ns reading when the phase started
+
+        Returns:
+            int: perf_counter_ns reading now, i.e. the start of the next
+                phase
+        """
+
+        now = perf_counter_ns()
+        try:
+            self.phases[name].record(now - start)
+        except KeyError:
+            self.phase(name).record(now - start)
+        return now
+
+    @staticmethod
+    def usage():
+        """CPU time and memory used by this process
+
+        Returns:
+            dict: User and system CPU seconds, current and peak RSS in bytes
+        """
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        try:
+            with open('/proc/self/statm', 'rb') as statm:
+                rss = int(statm.read().split()[1]) * \
+                    os.sysconf('SC_PAGE_SIZE')
+        except (IOError, OSError, IndexError, ValueError):  # Not Linux
+            rss = None
+        return {'cpu_user_s': usage.ru_utime,
+                'cpu_system_s': usage.ru_stime,
+                'rss_bytes': rss,
+                'max_rss_bytes': usage.ru_maxrss * 1024}
+
+    def snapshot(self):
+        """Everything measured so far
+
+        Returns:
+            dict: PID, uptime, resource usage including CPU percent averaged
+                over the uptime, and a summary per phase
+        """
+
+        uptime = time.time() - self.started
+        snapshot = {'pid': os.getpid(), 'uptime_s': round(uptime, 3)}
+        snapshot.update(self.usage())
+        snapshot['cpu_percent'] = round(
+                (snapshot['cpu_user_s'] + snapshot['cpu_system_s']) * 100.0 /
+                uptime, 3) if uptime > 0 else None
+        snapshot['phases'] = dict((name, histogram.snapshot()) for
+                                  name, histogram in
+                                  list(self.phases.items()))
+        return snapshot
+
+    def dump(self, path):
+        """Write a snapshot as JSON, replacing path atomically
+
+        Args:
+            path (str): File to write
+        """
+
+        temporary_path = '{0}.{1}'.format(path, str(os.getpid()))
+        with open(temporary_path, 'w') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file, indent=2,
+                      sort_keys=True)
+        os.replace(temporary_path, path)  # Readers never see half
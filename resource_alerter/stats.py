@@ -0,0 +1,199 @@
+#! /usr/bin/env python
+
+"""Fixed-memory history of resource usage samples with rolling statistics
+
+Copyright:
+
+    stats.py keep resource usage samples and rolling statistics
+    Copyright (C) 2015  Alex Hyer
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+import bisect
+
+__author__ = 'Alex Hyer'
+__email__ = 'theonehyer@gmail.com'
+__license__ = 'GPLv3'
+__maintainer__ = 'Alex Hyer'
+__status__ = 'Production'
+__version__ = '1.0.0'
+
+# Statistics that may be named by alert_statistic in resource_alerterd.conf
+STATISTICS = ('last', 'ewma', 'mean', 'min', 'max', 'p95')
+
+
+class SampleRing:
+    """Last N samples of one metric in preallocated arrays
+
+    Samples live in a circular pair of arrays of timestamps and values, and
+    the values of the window are also kept in a sorted array. Adding a
+    sample updates the sum and EWMA in O(1) and the sorted window with a
+    binary search plus one memmove, after which the mean, minimum, maximum
+    and any percentile of the window are read in O(1). Memory never grows
+    past what is allocated at creation.
+
+    Attributes:
+        alpha (float): Weight of the newest sample in the EWMA
+
+        capacity (int): Maximum number of samples kept
+
+        count (int): Number of samples currently kept
+
+        ewma (float): Exponentially weighted moving average of all samples,
+            None before the first sample
+
+        times (array): Sample timestamps, oldest at index when full
+
+        values (array): Sample values, aligned with times
+    """
+
+    def __init__(self, capacity, alpha=0.3):
+        """Preallocate storage for capacity samples
+
+        Args:
+            capacity (int): Maximum number of samples kept
+
+            alpha (float): Weight of the newest sample in the EWMA, between
+                0.0 and 1.0
+        """
+
+        self.alpha = alpha
+        self.capacity = int(capacity)
+        self.count = 0
+        self.ewma = None
+        self.index = 0  # Where the next sample is written
+        self.sorted_values = array('d')
+        self.times = array('d', bytes(8 * self.capacity))
+        self.total = 0.0
+        self.values = array('d', bytes(8 * self.capacity))
+
+    def add(self, timestamp, value):
+        """Add a sample, evicting the oldest sample if full
+
+        Args:
+            timestamp (float): Time of the sample in seconds since Epoch
+
+            value (float): Sampled value
+        """
+
+        index = self.index
+        if self.count == self.capacity:
+            oldest = self.values[index]
+            del self.sorted_values[bisect.bisect_left(self.sorted_values,
+                                                      oldest)]
+            self.total -= oldest
+        else:
+            self.count += 1
+        self.times[index] = timestamp
+        self.values[index] = value
+        self.index = (index + 1) % self.capacity
+        bisect.insort(self.sorted_values, value)
+        self.total += value
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            self.ewma += self.alpha * (value - self.ewma)
+
+    @property
+    def last(self):
+        """Most recent sample, None if empty"""
+
+        if not self.count:
+            return None
+        return self.values[self.index - 1]
+
+    @property
+    def last_time(self):
+        """Timestamp of the most recent sample, None if empty"""
+
+        if not self.count:
+            return None
+        return self.times[self.index - 1]
+
+    @property
+    def maximum(self):
+        """Largest sample of the window, None if empty"""
+
+        return self.sorted_values[-1] if self.count else None
+
+    @property
+    def mean(self):
+        """Mean of the window, None if empty"""
+
+        return self.total / self.count if self.count else None
+
+    @property
+    def minimum(self):
+        """Smallest sample of the window, None if empty"""
+
+        return self.sorted_values[0] if self.count else None
+
+    def percentile(self, percent):
+        """Nearest-rank percentile of the window
+
+        Args:
+            percent (float): Percentile between 0.0 and 100.0
+
+        Returns:
+            float: Smallest sample greater than or equal to percent of the
+                window, None if empty
+        """
+
+        if not self.count:
+            return None
+        rank = int(-(-percent * self.count // 100.0))  # Ceiling division
+        return self.sorted_values[min(max(rank, 1), self.count) - 1]
+
+    def statistic(self, name):
+        """Look up a statistic by its name in resource_alerterd.conf
+
+        Args:
+            name (str): One of STATISTICS
+
+        Returns:
+            float: Value of the statistic, None if empty
+
+        Raises:
+            ValueError: If name is not in STATISTICS
+        """
+
+        if name == 'last':
+            return self.last
+        elif name == 'ewma':
+            return self.ewma
+        elif name == 'mean':
+            return self.mean
+        elif name == 'min':
+            return self.minimum
+        elif name == 'max':
+            return self.maximum
+        elif name == 'p95':
+            return self.percentile(95.0)
+        raise ValueError('Unknown statistic "{0}": must be one of '
+                         '{1}'.format(name, ', '.join(STATISTICS)))
+
+    def window(self):
+        """Timestamps and values of the window from oldest to newest
+
+        Returns:
+            tuple: (times, values), two arrays copied out of the ring
+        """
+
+        if self.count < self.capacity:
+            return self.times[:self.count], self.values[:self.count]
+        index = self.index
+        return (self.times[index:] + self.times[:index],
+                self.values[index:] + self.values[:index])
@@ -33,8 +33,12 @@ setup(name='resource_alerter',
           'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
           'Natural Language :: English',
           'Operating System :: Unix',
-          'Programming Language :: Python :: 2.7',
-          'Programming Language :: Python :: 3.4',
+          'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3 :: Only',
+          'Programming Language :: Python :: 3.9',
+          'Programming Language :: Python :: 3.10',
+          'Programming Language :: Python :: 3.11',
+          'Programming Language :: Python :: 3.12',
           'Topic :: System :: Logging',
           'Topic :: System :: Monitoring'
       ],
@@ -51,8 +55,10 @@ setup(name='resource_alerter',
       },
       include_package_data=True,
       zip_safe=False,
+      python_requires='>=3.9',
       scripts=[
-          'resource_alerter/resource_alerterd.py'
+          'resource_alerter/resource_alerterd.py',
+          'resource_alerter/resource_alerter_stats.py'
       ],
       install_requires=[
           'docutils',